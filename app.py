@@ -3,12 +3,22 @@ import os
 from flask import Flask, request
 import sett
 import services
+import metrics
+import pipeline
+import dedup
+import outbound
+import outbox
+import transport
 
 app = Flask(__name__)
 
 # 👉 Inicia el scheduler APENAS se levanta la app (sin depender de __main__)
 services.start_reminder_scheduler()
 
+# 👉 Pool de workers del webhook (modo ack-then-process)
+if sett.WEBHOOK_ASYNC:
+    pipeline.get_pipeline(services.administrar_chatbot)
+
 @app.route('/bienvenido', methods=['GET'])
 def bienvenido():
     return 'Hola, soy MedicAI, tu asistente virtual. ¿En qué puedo ayudarte?'
@@ -28,35 +38,42 @@ def recibir_mensaje():
         body = request.get_json(force=True)
         print("💥 LLEGÓ WEBHOOK:", body)
 
-        entry   = body['entry'][0]
-        changes = entry['changes'][0]
-        value   = changes['value']
-
-        if 'messages' not in value:
+        mensajes = services.extraer_mensajes(body)
+        if not mensajes:
             print("⚠️ Sin campo 'messages', ignorado")
             return 'Ignorado', 200
 
-        message   = value['messages'][0]
-        number    = message['from']
-        messageId = message['id']
-        name      = value['contacts'][0]['profile']['name']
+        # Descarta reentregas de Meta antes de hacer cualquier trabajo
+        dd = dedup.get_dedup()
+        nuevos = [m for m in mensajes if dd.first_time(m[2])]
+        metrics.incr("webhook.duplicates", len(mensajes) - len(nuevos))
+        if not nuevos:
+            print("♻️ Mensaje(s) duplicado(s), ignorado(s)")
+            return 'Duplicado', 200
+        mensajes = nuevos
+
+        for text, number, messageId, name in mensajes:
+            print(f"📨 Mensaje de {number} ({name}): {text}")
 
-        # --- EXTRAER SI VIENE interactive ---
-        if 'interactive' in message:
-            inter = message['interactive']
-            if inter['type'] == 'button_reply':
-                text = inter['button_reply']['id']
-            elif inter['type'] == 'list_reply':
-                text = inter['list_reply']['id']
-            else:
-                text = services.obtener_Mensaje_whatsapp(message)
-        else:
-            # Soporta text, image, document, button, etc.
-            text = services.obtener_Mensaje_whatsapp(message)
-        # --------------------------------------
+        if sett.WEBHOOK_ASYNC:
+            # Responde 200 de inmediato; el pool procesa en segundo plano
+            rechazados = pipeline.get_pipeline().submit_batch(mensajes)
+            if rechazados:
+                # Se olvidan para que el reintento de Meta sí se procese
+                for m in rechazados:
+                    dd.forget(m[2])
+                print("⚠️ Cola de webhook llena, se pide reintento a Meta")
+                return 'Cola llena', 503
+            return 'Encolado', 200
 
-        print(f"📨 Mensaje de {number} ({name}): {text}")
-        services.administrar_chatbot(text, number, messageId, name)
+        for i, (text, number, messageId, name) in enumerate(mensajes):
+            try:
+                services.administrar_chatbot(text, number, messageId, name)
+            except Exception:
+                # Se olvidan este y los siguientes: el reintento de Meta los procesa
+                for m in mensajes[i:]:
+                    dd.forget(m[2])
+                raise
         return 'Enviado', 200
 
     except KeyError as e:
@@ -66,6 +83,21 @@ def recibir_mensaje():
         print("❌ ERROR procesando webhook:", e)
         return str(e), 500
 
+@app.route('/metrics', methods=['GET'])
+def ver_metricas():
+    data = metrics.snapshot()
+    if sett.WEBHOOK_ASYNC:
+        data["webhook"] = pipeline.get_pipeline().stats()
+    data["outbound"] = outbound.get_outbound().stats()
+    data["outbox"] = outbox.get_outbox().stats()
+    data["breaker"] = transport.BREAKER.stats()
+    return data, 200
+
+@app.route('/metrics/rutas', methods=['GET'])
+def ver_metricas_rutas():
+    # Por ruta de administrar_chatbot: tiempos route/build/db/send/total y payloads
+    return metrics.snapshot_turnos(), 200
+
 if __name__ == '__main__':
     # Para entorno local
     port = int(os.getenv('PORT', 5000))
@@ -0,0 +1,870 @@
+# bench.py
+"""
+Benchmarks locales de MedicAI. No envían nada a la red.
+
+Uso:
+    python bench.py plantillas [-n 20000]
+    python bench.py rutas [-n 20000] [--paridad [--rev COMMIT]]
+    python bench.py intenciones [-n 2000]
+    python bench.py normalizacion [-n 20000]
+    python bench.py paridad [-n 2000] [--rev COMMIT] [--congelar [--casos 500]]
+    python bench.py triaje [-n 5000]
+    python bench.py puntaje [-n 2000] [--lote 1000]
+    python bench.py fuzzy [-n 2000] [--umbral 0.8]
+    python bench.py sintomas [-n 5000] [--lote 5000]
+    python bench.py replay [--rondas 20] [--hilos 1 4] [--archivo cuerpos.jsonl]
+"""
+import argparse
+import ast
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+# Valores de relleno para poder importar sett/services sin credenciales
+os.environ.setdefault("WHATSAPP_TOKEN", "bench")
+os.environ.setdefault("WHATSAPP_URL", "http://127.0.0.1:9/bench")
+os.environ.setdefault("VERIFY_TOKEN", "bench")
+os.environ.setdefault("MEDICAI_DB", os.path.join(tempfile.gettempdir(), "medicai_bench.db"))
+# Sin demoras artificiales ni límite de tasa: se mide el motor, no la política
+os.environ.setdefault("HUMANIZED_LATENCY", "0")
+os.environ.setdefault("REPLY_SPACING_SECONDS", "0")
+os.environ.setdefault("RATE_LIMIT_MPS", "0")
+
+import services  # noqa: E402
+import fuzzy  # noqa: E402
+import scoring  # noqa: E402
+import diagnostics  # noqa: E402
+import textnorm  # noqa: E402
+import outbound  # noqa: E402
+import transport  # noqa: E402
+from intents import Automata  # noqa: E402
+
+
+def _timeit(fn, n: int) -> float:
+    """Devuelve nanosegundos por llamada."""
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e9
+
+
+# ===================================================================
+# PLANTILLAS PRE-SERIALIZADAS vs BUILDERS
+# ===================================================================
+def bench_plantillas(args):
+    number = "56912345678"
+    plantillas = sorted(
+        (k, v) for k, v in vars(services).items()
+        if k.startswith("_T_") and isinstance(v, services.payload_cache.PayloadTemplate)
+    )
+    print(f"{'plantilla':26} {'bytes':>6} {'builder ns':>11} {'plantilla ns':>13} {'speedup':>8}")
+    for nombre, tpl in plantillas:
+        # El builder recibe los mismos argumentos con que se compiló
+        build_args = (number,) + tuple(tpl.args[1:])
+        valores = {s: "Ana" for s in tpl.slots if s != "to"}
+        builder = lambda: tpl.builder(*build_args)
+        render = lambda: tpl.render(number, **valores)
+        esperado = tpl.builder(*build_args).replace(services.payload_cache.slot("name"), "Ana")
+        assert render() == esperado.encode("ascii"), f"{nombre}: difiere del builder"
+        b = _timeit(builder, args.n)
+        r = _timeit(render, args.n)
+        print(f"{nombre:26} {len(render()):6} {b:11.0f} {r:13.0f} {b / r:7.1f}x")
+
+
+# ===================================================================
+# ROUTER DE INTENCIONES
+# ===================================================================
+def bench_rutas(args):
+    if args.paridad:
+        _paridad_rutas(args)
+        return
+    casos = [
+        "hola", "menu_mas", "agendar cita", "medicina general", "cita_datetime_row_3",
+        "retire paracetamol si", "stock agregar ibuprofeno 10", "mis retiros",
+        "muchas gracias", "xyz desconocido",
+    ]
+    relleno = "me duele un poco la cabeza desde ayer en la tarde "
+    for largo in (100, 1000, 5000):
+        casos.append((relleno * (largo // len(relleno) + 1))[:largo])
+
+    print(f"{'texto':32} {'largo':>6} {'ruta':24} {'ns':>9}")
+    for text in casos:
+        ruta = services.RUTAS.resolver(text, "56900000000")
+        ns = _timeit(lambda: services.RUTAS.resolver(text, "56900000000"), args.n)
+        print(f"{text[:32]:32} {len(text):6} {ruta.nombre:24} {ns:9.0f}")
+
+
+def _rev_router() -> str:
+    """Última revisión con la cadena if/elif: la anterior a crear router.py."""
+    agregado = _git("log", "--diff-filter=A", "--format=%H", "--", "router.py").split()
+    return f"{agregado[-1]}^" if agregado else "HEAD"
+
+
+def _cadena_original(rev: str) -> list:
+    """
+    Condiciones de la cadena if/elif de administrar_chatbot en rev:
+    [(código, fuente)], primero la guarda de orientación activa.
+    """
+    arbol = ast.parse(_git("show", f"{rev}:services.py"))
+    funcion = next(n for n in arbol.body
+                   if isinstance(n, ast.FunctionDef) and n.name == "administrar_chatbot")
+    ifs = [n for n in funcion.body if isinstance(n, ast.If)]
+    guarda = next(n for n in ifs if "'categoria'" in ast.unparse(n.test))
+    cadena = max(ifs, key=lambda n: len(ast.unparse(n)))
+    tests = [guarda.test]
+    while True:
+        tests.append(cadena.test)
+        if len(cadena.orelse) != 1 or not isinstance(cadena.orelse[0], ast.If):
+            break
+        cadena = cadena.orelse[0]
+    return [(compile(ast.Expression(t), f"{rev}:services.py", "eval"), ast.unparse(t))
+            for t in tests]
+
+
+def _paridad_rutas(args):
+    """RUTAS.resolver vs la cadena if/elif original, con textos y sesiones aleatorios."""
+    rev = args.rev or _rev_router()
+    cadena = _cadena_original(rev)
+    # orientacion_triage no existía: el menú de orientación abierto no capturaba
+    nombres = [r.nombre for r in services.RUTAS.rutas if r.nombre != "orientacion_triage"]
+    if len(cadena) != len(nombres):
+        sys.exit(f"{rev}: {len(cadena)} ramas y {len(nombres)} rutas")
+    vocabulario = sorted({c.value for _, fuente in cadena
+                          for c in ast.walk(ast.parse(fuente, mode="eval"))
+                          if isinstance(c, ast.Constant) and isinstance(c.value, str)})
+    vocabulario += ["", "x", "hola que tal", "retire x si", "stock agregar paracetamol 3",
+                    "orientacion_bucal_extraccion", "orientacion_x", "cita_datetime_row_3"]
+    number, flujos = "56900000000", services.FLUJOS
+    sesiones = {"session_states": {}, "stock_sessions": {}, "route_sessions": {}}
+
+    def original(text):
+        entorno = dict(sesiones, text=text, number=number)
+        for (codigo, _), nombre in zip(cadena, nombres):
+            if eval(codigo, entorno):
+                return nombre
+        return services.RUTAS.defecto.nombre
+
+    rnd = random.Random(16)
+    distintos = []
+    for _ in range(args.n):
+        partes = [rnd.choice(vocabulario) for _ in range(rnd.randint(1, 3))]
+        text = rnd.choice([" ".join(partes), "".join(partes), partes[0], partes[0] + "zz"])
+        for d in sesiones.values():
+            d.clear()
+        flujos.almacen.limpiar()
+        r = rnd.random()
+        if r < 0.15:
+            sesiones["session_states"][number] = {"flow": "med", "step": "ask_name"}
+            flujos.iniciar(number, "med", "ask_name")
+        elif r < 0.25:
+            sesiones["session_states"][number] = {"categoria": "bucal", "paso": "extraccion"}
+            flujos.iniciar(number, "orientacion", "extraccion", categoria="bucal")
+        if rnd.random() < 0.3:
+            sesiones["stock_sessions"][number] = {"step": "activate"}
+            flujos.iniciar(number, "stock", "activate")
+        if rnd.random() < 0.3:
+            sesiones["route_sessions"][number] = {"step": "choose_type"}
+            flujos.iniciar(number, "ruta", "choose_type")
+        esperado, nuevo = original(text), services.RUTAS.resolver(text, number).nombre
+        if esperado != nuevo:
+            distintos.append((text, esperado, nuevo))
+    flujos.almacen.limpiar()
+
+    print(f"referencia: cadena if/elif de {rev}:services.py ({len(cadena)} ramas)")
+    for text, esperado, nuevo in distintos[:10]:
+        print(f"  {text!r}: {esperado} -> {nuevo}")
+    print(f"{len(distintos)} diferencias en {args.n} mensajes")
+    if distintos:
+        sys.exit(1)
+
+
+# ===================================================================
+# INTENCIONES / SÍNTOMAS: Aho-Corasick vs escaneos con `in`
+# ===================================================================
+_PALABRAS_INTENCION = [
+    ["ayuda urgente", "urgente", "accidente", "samu", "131"],
+    ["hola", "buenas", "saludos"],
+    ["agendar cita", "cita medica"],
+    ["recordatorio de medicamento"],
+    ["orientacion de sintomas"],
+    ["gracias", "muchas gracias"],
+    ["adiós", "chao", "hasta luego"],
+    ["guia de ruta", "derivacion", "ruta de atencion"],
+]
+
+
+_AUTOMATA_INTENCION = Automata(
+    (w, i) for i, palabras in enumerate(_PALABRAS_INTENCION) for w in palabras
+)
+
+
+def _intenciones_con_in(text):
+    return [i for i, palabras in enumerate(_PALABRAS_INTENCION) if any(w in text for w in palabras)]
+
+
+def _intenciones_automata(text):
+    return sorted(_AUTOMATA_INTENCION.etiquetas(text))
+
+
+def _sintomas_con_in(text):
+    low = textnorm.normalizar(text)
+    return {cat: [s for s in ids if s in low] for cat, ids in services.SINTOMAS.conocidos.items()}
+
+
+def _sintomas_automata(text):
+    sintomas = services.SINTOMAS.ids(text)
+    return {cat: services.SINTOMAS.de_categoria(sintomas, cat) for cat in services.SINTOMAS.conocidos}
+
+
+def bench_intenciones(args):
+    frase = "tengo tos seca y fiebre desde ayer, dolor de cabeza y mucho cansancio, gracias "
+    print(f"{'caso':34} {'largo':>6} {'in ns':>10} {'automata ns':>12} {'speedup':>8}")
+    for largo in (80, 500, 2000, 8000):
+        text = (frase * (largo // len(frase) + 1))[:largo]
+        # Mismo resultado por ambos caminos
+        assert _sintomas_con_in(text) == _sintomas_automata(text)
+        assert _intenciones_con_in(text) == _intenciones_automata(text)
+        casos = [
+            ("intenciones (8 listas)", lambda: _intenciones_con_in(text),
+             lambda: _intenciones_automata(text)),
+            ("síntomas (todas las categorías)", lambda: _sintomas_con_in(text),
+             lambda: services.SINTOMAS.ids(text)),
+        ]
+        for nombre, con_in, automata in casos:
+            a = _timeit(con_in, args.n)
+            b = _timeit(automata, args.n)
+            print(f"{nombre:34} {largo:6} {a:10.0f} {b:12.0f} {a / b:7.2f}x")
+
+
+# ===================================================================
+# NORMALIZACIÓN DE TEXTO: textnorm vs algoritmo original
+# ===================================================================
+def _paridad_normalizacion() -> int:
+    """Compara con textnorm.referencia cada carácter Unicode, solo y en contexto."""
+    malos = 0
+    for cp in range(0x110000):
+        if 0xD800 <= cp <= 0xDFFF:
+            continue
+        c = chr(cp)
+        for texto in (c, "A" + c + "b", c + c):
+            if textnorm._normalizar(texto) != textnorm.referencia(texto):
+                malos += 1
+    return malos
+
+
+def bench_normalizacion(args):
+    largo = "¿Cómo estás? Tengo fiebre, TOS SECA y dolor de cabeza desde ayer 🤒 " * 30
+    casos = [
+        ("ascii corto", "hola"),
+        ("ascii mayúsculas", "Recordatorio de Medicamento"),
+        ("tildes", "¿Cómo estás? Tengo fiebre y congestión nasal"),
+        ("emoji", "➡️ Ver más especialidades"),
+        ("largo (sin LRU)", largo),
+    ]
+    print(f"{'caso':20} {'largo':>6} {'original ns':>12} {'sin LRU ns':>11} {'LRU ns':>8} {'speedup':>8}")
+    for nombre, texto in casos:
+        assert textnorm.normalizar(texto) == textnorm.referencia(texto)
+        a = _timeit(lambda: textnorm.referencia(texto), args.n)
+        b = _timeit(lambda: textnorm._normalizar(texto), args.n)
+        c = _timeit(lambda: textnorm.normalizar(texto), args.n)
+        print(f"{nombre:20} {len(texto):6} {a:12.0f} {b:11.0f} {c:8.0f} {a / min(b, c):7.1f}x")
+    t0 = time.perf_counter()
+    malos = _paridad_normalizacion()
+    print(f"\nparidad con el algoritmo original (todo Unicode, solo y en contexto): "
+          f"{malos} diferencias ({time.perf_counter() - t0:.1f}s)")
+
+
+# ===================================================================
+# DIAGNÓSTICOS: motor de reglas compilado vs cadenas if/elif originales
+# ===================================================================
+def _git(*args) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, encoding="utf-8-sig", check=True,
+    ).stdout
+
+
+# Salidas de las funciones diagnostico_* originales (if/elif) sobre el corpus
+# de _textos_diagnostico, congeladas con `python bench.py paridad --congelar`;
+# así la paridad no depende de la historia de git (tests/test_diagnostics.py)
+FIXTURE_PARIDAD = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "tests", "diagnosticos_originales.json")
+
+
+def _diagnosticos_originales(rev: str) -> dict:
+    """Las funciones diagnostico_* de services.py en la revisión rev (solo esas defs)."""
+    arbol = ast.parse(_git("show", f"{rev}:services.py"))
+    defs = [n for n in arbol.body
+            if isinstance(n, ast.FunctionDef) and n.name.startswith("diagnostico_")]
+    espacio = {}
+    exec(compile(ast.Module(body=defs, type_ignores=[]), f"{rev}:services.py", "exec"), espacio)
+    return {n.name[len("diagnostico_"):]: espacio[n.name] for n in defs}
+
+
+def _rev_original() -> str:
+    """Última revisión con las cadenas if/elif: la anterior a crear diagnostics.py."""
+    agregado = _git("log", "--diff-filter=A", "--format=%H", "--", "diagnostics.py").split()
+    return f"{agregado[-1]}^" if agregado else "HEAD"
+
+
+def _textos_diagnostico(n: int, terminos: list, otros: list) -> list:
+    """Combinaciones aleatorias de términos, con ruido, mayúsculas y pegados."""
+    rnd = random.Random(21)
+    relleno = ["", "y", "tengo", "desde ayer", "mucho", "no", "x"]
+    textos = []
+    for _ in range(n):
+        partes = []
+        for _ in range(rnd.randint(1, 6)):
+            r = rnd.random()
+            partes.append(rnd.choice(terminos if r < 0.7 else otros if r < 0.85 else relleno))
+        texto = rnd.choice([", ", " ", ""]).join(partes)
+        if rnd.random() < 0.2:
+            texto = texto.upper()
+        textos.append(texto)
+    return textos
+
+
+def _congelar_paridad(rev: str, n: int):
+    """Escribe FIXTURE_PARIDAD con las salidas de las funciones originales de rev."""
+    originales = _diagnosticos_originales(rev)
+    faltan = set(diagnostics.CATEGORIAS) - set(originales)
+    if faltan:
+        sys.exit(f"{rev}:services.py no tiene diagnostico_{sorted(faltan)}")
+    todos = sorted({t for c in diagnostics.CATEGORIAS.values() for t in c.bits})
+    resultados = {diagnostics.SIN_DIAGNOSTICO: 0}
+    casos = {}
+    for nombre, categoria in diagnostics.CATEGORIAS.items():
+        casos[nombre] = [
+            (t, resultados.setdefault(tuple(originales[nombre](t)), len(resultados)))
+            for t in _textos_diagnostico(n, list(categoria.bits), todos)
+        ]
+    # un caso por línea: los cambios al fixture se leen en un diff
+    lineas = ["{", f'"rev": {json.dumps(_git("rev-parse", rev).strip())},', '"resultados": [']
+    lineas.append(",\n".join(json.dumps(list(r), ensure_ascii=False) for r in resultados) + "],")
+    lineas.append('"casos": {')
+    bloques = []
+    for nombre, lista in casos.items():
+        bloques.append(f"{json.dumps(nombre)}: [\n"
+                       + ",\n".join(json.dumps([t, i], ensure_ascii=False) for t, i in lista) + "]")
+    lineas.append(",\n".join(bloques) + "}}")
+    with open(FIXTURE_PARIDAD, "w", encoding="utf-8") as f:
+        f.write("\n".join(lineas) + "\n")
+    total = sum(len(lista) for lista in casos.values())
+    print(f"{os.path.relpath(FIXTURE_PARIDAD)}: {total} casos de {rev} ({len(resultados)} salidas distintas)")
+
+
+def cargar_paridad() -> dict:
+    """{ categoria: [(texto, (diagnóstico, nivel, recomendación))] } del fixture."""
+    with open(FIXTURE_PARIDAD, encoding="utf-8") as f:
+        fixture = json.load(f)
+    resultados = [tuple(r) for r in fixture["resultados"]]
+    return {nombre: [(t, resultados[i]) for t, i in lista]
+            for nombre, lista in fixture["casos"].items()}
+
+
+def bench_paridad(args):
+    if args.congelar:
+        _congelar_paridad(args.rev or _rev_original(), args.casos)
+        return
+    casos = cargar_paridad()
+    # para medir las cadenas if/elif hace falta la historia de git (opcional)
+    try:
+        rev = args.rev or _rev_original()
+        originales = _diagnosticos_originales(rev)
+    except (OSError, subprocess.CalledProcessError):
+        rev, originales = None, {}
+    origen = f"funciones diagnostico_* de {rev}:services.py" if originales else "sin historia de git"
+
+    print(f"referencia: {os.path.relpath(FIXTURE_PARIDAD)} (if/elif medido: {origen})")
+    print(f"{'categoria':22} {'casos':>6} {'dif':>4} {'con diag':>8} {'if/elif ns':>11} "
+          f"{'texto ns':>9} {'mascara ns':>11} {'texto/if':>9}")
+    malos = 0
+    for nombre, categoria in diagnostics.CATEGORIAS.items():
+        lista = casos[nombre]
+        textos = [t for t, _ in lista]
+        mascaras = [categoria.mascara(t) for t in textos]
+        dif = con_diag = 0
+        for (t, esperado), m in zip(lista, mascaras):
+            nuevo = categoria.evaluar(t)
+            if (esperado != nuevo or diagnostics.referencia(nombre, t) != nuevo
+                    or categoria.evaluar_mascara(m) != nuevo):
+                dif += 1
+            con_diag += nuevo[0] is not None
+        malos += dif
+        muestra, rep = textos[:500], max(1, args.n // 500)
+        b = _timeit(lambda: [categoria.evaluar(t) for t in muestra], rep) / len(muestra)
+        c = _timeit(lambda: [categoria.evaluar_mascara(m) for m in mascaras[:500]], rep) / len(muestra)
+        if nombre in originales:
+            original = originales[nombre]
+            a = _timeit(lambda: [original(t) for t in muestra], rep) / len(muestra)
+            columnas = f"{a:11.0f} {b:9.0f} {c:11.0f} {b / a:8.2f}x"
+        else:
+            columnas = f"{'-':>11} {b:9.0f} {c:11.0f} {'-':>9}"
+        print(f"{nombre:22} {len(lista):6} {dif:4} {con_diag:8} {columnas}")
+    print(f"\n{malos} diferencias ({len(diagnostics.CATEGORIAS)} categorías)")
+    if malos:
+        sys.exit(1)
+
+
+# ===================================================================
+# TRIAJE: índice invertido vs recorrer las 12 categorías una por una
+# ===================================================================
+def _triaje_por_categoria(sintomas):
+    """Lo que costaría sin índice: síntomas + diagnóstico en cada categoría."""
+    candidatos = []
+    for categoria in services.SINTOMAS_CONOCIDOS:
+        detectados = services.SINTOMAS.de_categoria(sintomas, categoria)
+        diagnostico = diagnostics.obtener(categoria).evaluar_sintomas(sintomas)
+        if detectados or diagnostico[0]:
+            candidatos.append((categoria, diagnostico, detectados))
+    return candidatos
+
+
+def bench_triaje(args):
+    casos = [
+        ("sin síntomas", "hola, quiero saber si me pueden ayudar"),
+        ("una categoría", "tengo tos seca, fiebre y dolores musculares desde ayer"),
+        ("varias categorías", "ardor al orinar, fiebre, diarrea y dolor abdominal, me pica la piel"),
+        ("largo", "me siento mal, tengo dolor de cabeza pulsatil y nauseas, " * 20),
+    ]
+    print(f"{'caso':20} {'largo':>6} {'por categoría ns':>17} {'índice ns':>10} {'speedup':>8}  mejor candidato")
+    for nombre, texto in casos:
+        texto = textnorm.normalizar(texto)
+        sintomas = services.SINTOMAS.ids(texto)
+        a = _timeit(lambda: _triaje_por_categoria(sintomas), args.n)
+        b = _timeit(lambda: services.TRIAJE.clasificar(sintomas), args.n)
+        mejor = services.TRIAJE.clasificar(sintomas, limite=1)
+        etiqueta = (f"{mejor[0].categoria} {mejor[0].cobertura:.0%} "
+                    f"{mejor[0].diagnostico[0] if mejor[0].diagnostico else '-'}") if mejor else "-"
+        print(f"{nombre:20} {len(texto):6} {a:17.0f} {b:10.0f} {a / b:7.2f}x  {etiqueta}")
+
+
+# ===================================================================
+# PUNTAJE DIFERENCIAL: numpy (matrices) vs máscaras de bits
+# ===================================================================
+def bench_puntaje(args):
+    caminos = [("bits", scoring.Puntuador(usar_numpy=False))]
+    if scoring.np is not None:
+        caminos.append(("numpy", scoring.Puntuador()))
+    else:
+        print("numpy no está instalado: solo el camino con bits")
+    bits = caminos[0][1]
+    terminos = sorted(bits.terminos)
+    textos = [textnorm.normalizar(t) for t in _textos_diagnostico(args.lote, terminos, terminos)]
+
+    # cobertura 1.0: la primera regla completa de cada categoría es la de diagnostics.py
+    malos = 0
+    for texto, puntajes in zip(textos, bits.puntuar_lote(textos, minimo=1.0)):
+        primeras = {}
+        for p in puntajes:
+            primeras.setdefault(p.categoria, p.diagnostico)
+        for categoria in services.SINTOMAS_CONOCIDOS:
+            if primeras.get(categoria) != diagnostics.diagnosticar(categoria, texto)[0]:
+                malos += 1
+    print(f"coberturas 1.0 vs diagnostics.py: {malos} diferencias en {len(textos)} textos")
+    malos = 0
+    for texto in textos:
+        sintomas = services.SINTOMAS.ids(texto)
+        primeras = {}
+        for p in bits.puntuar_sintomas(sintomas, minimo=1.0):
+            primeras.setdefault(p.categoria, p.diagnostico)
+        for categoria in services.SINTOMAS_CONOCIDOS:
+            if primeras.get(categoria) != diagnostics.obtener(categoria).evaluar_sintomas(sintomas)[0]:
+                malos += 1
+    print(f"con IDs canónicos (puntuar_sintomas vs evaluar_sintomas): {malos} diferencias")
+    if len(caminos) == 2:
+        iguales = caminos[0][1].puntuar_lote(textos) == caminos[1][1].puntuar_lote(textos)
+        print(f"numpy vs bits: {'mismos rankings' if iguales else 'RANKINGS DISTINTOS'}")
+
+    mensaje = textnorm.normalizar("tengo tos seca, fiebre y dolor de cabeza pulsatil desde ayer")
+    print(f"\n{'camino':8} {'1 mensaje us':>13} {'lote us/msg':>12} {'solo matriz us/msg':>19}")
+    for nombre, puntuador in caminos:
+        uno = _timeit(lambda: puntuador.puntuar(mensaje, limite=3), args.n) / 1000
+        t0 = time.perf_counter()
+        puntuador.puntuar_lote(textos, limite=3)
+        lote = (time.perf_counter() - t0) / len(textos) * 1e6
+        t0 = time.perf_counter()
+        puntuador.coberturas(textos)
+        matriz = (time.perf_counter() - t0) / len(textos) * 1e6
+        print(f"{nombre:8} {uno:13.1f} {lote:12.1f} {matriz:19.1f}")
+
+
+# ===================================================================
+# SÍNTOMAS CON TIPEOS: costo por mensaje y aciertos del índice de trigramas
+# ===================================================================
+_PALABRAS_COMUNES = (
+    "hola quiero agendar una cita con el medico para mañana tengo que tomar mis "
+    "remedios dos veces al dia necesito ayuda por favor gracias cuando puedo ir "
+    "color cambio cuerpo siento estoy mareada cansada duele mucho desde ayer semana "
+    "noche comida trabajo hijo hija mama papa casa calle farmacia consultorio hospital"
+).split()
+
+
+def _tipeo(palabra: str, rnd) -> str:
+    """Un error de tipeo (sustituir, borrar, insertar o trasponer), sin tocar la 1ª letra."""
+    i = rnd.randrange(1, len(palabra))
+    letra = rnd.choice("abcdefghijklmnopqrstuvwxyz")
+    op = rnd.randrange(4)
+    if op == 0:
+        return palabra[:i] + letra + palabra[i + 1:]
+    if op == 1:
+        return palabra[:i] + palabra[i + 1:]
+    if op == 2:
+        return palabra[:i] + letra + palabra[i:]
+    if i == len(palabra) - 1:
+        i -= 1
+    return palabra[:i] + palabra[i + 1] + palabra[i] + palabra[i + 2:]
+
+
+def bench_fuzzy(args):
+    indice = services.SINTOMAS.tipeos
+    rnd = random.Random(24)
+    largas = [p for p in indice.palabras if len(p) >= 6]
+    aciertos = total = 0
+    for _ in range(2000):
+        palabra = rnd.choice(largas)
+        tipeo = _tipeo(palabra, rnd)
+        if tipeo in indice._vocabulario or fuzzy.similitud(tipeo, palabra) < args.umbral:
+            continue
+        total += 1
+        aciertos += indice.cercana(tipeo, args.umbral) == palabra
+    falsos = [(p, indice.cercana(p, args.umbral)) for p in _PALABRAS_COMUNES]
+    falsos = [f"{a}→{b}" for a, b in falsos if b]
+    print(f"vocabulario: {len(indice.palabras)} palabras, umbral {args.umbral}")
+    print(f"tipeos de 1 error en palabras de 6+ letras corregidos: {aciertos}/{total}")
+    print(f"palabras comunes corregidas por error: {len(falsos)}/{len(_PALABRAS_COMUNES)} {falsos}")
+
+    casos = [
+        ("exacto", "tengo tos seca y fiebre"),
+        ("tipeos", "tengo fievre, congestion nazal y dolor de garganata"),
+        ("sin síntomas", "hola quiero saber el horario de la farmacia por favor"),
+        ("largo (tope)", "me siento mal, tengo fievre y me duele la cabesa " * 200),
+    ]
+    print(f"\n{'caso':14} {'largo':>6} {'frío us':>9} {'LRU us':>8}  correcciones")
+    for nombre, texto in casos:
+        texto = textnorm.normalizar(texto)
+        indice._cercana.cache_clear()
+        t0 = time.perf_counter()
+        _, cambios = indice.corregir(texto, args.umbral, services.sett.FUZZY_MAX_PALABRAS)
+        frio = (time.perf_counter() - t0) * 1e6
+        caliente = _timeit(lambda: indice.corregir(texto, args.umbral, services.sett.FUZZY_MAX_PALABRAS),
+                           args.n) / 1000
+        vistos = ", ".join(dict.fromkeys(f"{a}→{b}" for a, b in cambios))
+        print(f"{nombre:14} {len(texto):6} {frio:9.0f} {caliente:8.1f}  {vistos or '-'}")
+
+
+# ===================================================================
+# IDS CANÓNICOS: una extracción para síntomas y diagnóstico vs releer el texto
+# ===================================================================
+def _flujo_texto(texto, categoria):
+    """Flujo anterior: lista de síntomas con `in` + diagnóstico releyendo el texto."""
+    detectados = [s for s in services.SINTOMAS_CONOCIDOS[categoria] if s in texto]
+    return detectados, diagnostics.diagnosticar(categoria, texto)
+
+
+def _flujo_ids(texto, categoria):
+    sintomas = services.SINTOMAS.ids(texto)
+    detectados = services.SINTOMAS.de_categoria(sintomas, categoria)
+    return detectados, diagnostics.obtener(categoria).evaluar_sintomas(sintomas)
+
+
+def bench_sintomas(args):
+    terminos = sorted({t for c in diagnostics.CATEGORIAS.values() for t in c.bits}
+                      | {s for ss in services.SINTOMAS_CONOCIDOS.values() for s in ss})
+    textos = [textnorm.normalizar(t) for t in _textos_diagnostico(args.lote, terminos, terminos)]
+    # el flujo normaliza antes de extraer: lo que cambia es solo qué reglas se alcanzan
+    iguales = nuevos = cambiados = 0
+    alcanzables = {}
+    for texto in textos:
+        for categoria in services.SINTOMAS_CONOCIDOS:
+            _, antes = _flujo_texto(texto, categoria)
+            _, ahora = _flujo_ids(texto, categoria)
+            if antes == ahora:
+                iguales += 1
+                continue
+            if antes[0] is None:
+                nuevos += 1
+            else:
+                cambiados += 1
+            alcanzables[ahora[0]] = alcanzables.get(ahora[0], 0) + 1
+    print(f"vocabulario: {len(services.SINTOMAS.vocabulario)} IDs canónicos "
+          f"({len(terminos)} términos escritos)")
+    print(f"{len(textos)} textos × {len(services.SINTOMAS_CONOCIDOS)} categorías: {iguales} iguales, "
+          f"{nuevos} diagnósticos nuevos, {cambiados} cambiados")
+    for diagnostico, n in sorted(alcanzables.items(), key=lambda kv: -kv[1]):
+        print(f"  {n:6}  {diagnostico}")
+
+    mensaje = textnorm.normalizar("tengo estornudos, congestion nasal y picazon en los ojos desde ayer")
+    print(f"\n{'caso':26} {'texto ns':>10} {'IDs ns':>8}  diagnóstico (texto / IDs)")
+    for categoria in ("respiratorio", "otorrinolaringologico"):
+        a = _timeit(lambda: _flujo_texto(mensaje, categoria), args.n)
+        b = _timeit(lambda: _flujo_ids(mensaje, categoria), args.n)
+        print(f"{categoria:26} {a:10.0f} {b:8.0f}  {_flujo_texto(mensaje, categoria)[1][0]} / "
+              f"{_flujo_ids(mensaje, categoria)[1][0]}")
+
+
+# ===================================================================
+# REPLAY DE WEBHOOKS (motor de conversación con transporte en memoria)
+# ===================================================================
+# Reproduce cuerpos de webhook (grabados o sintéticos) por
+# extraer_mensajes + administrar_chatbot, con outbox y cola de salida
+# reales pero transport.post reemplazado por TransporteMemoria. Los
+# mensajes de un mismo número van siempre por el mismo hilo y en orden,
+# igual que los carriles de pipeline.py.
+
+CONVERSACIONES = {
+    "saludo": ["hola", "menu_mas", "comandos", "gracias", "chao", "xyz desconocido"],
+    "citas": [
+        "agendar cita", "cita_especialidad_row_7", "cita_especialidad2_row_10",
+        "cita_especialidad_row_1", "cita_fecha_btn_1", "cita_datetime_row_3",
+        "cita_sede_btn_2", "cita_nueva_sede_row_2", "cita_confirmacion_btn_1",
+    ],
+    "recordatorios": [
+        "recordatorio de medicamento", "paracetamol", "med_freq_row_1", "08:00 y 20:00",
+        "mis recordatorios", "gestionar recordatorios", "eliminar recordatorio 1",
+    ],
+    "stock": [
+        "stock de medicamentos", "stock_activa_row_1", "paracetamol", "stock_freq_row_1", "09:00",
+        "retire paracetamol si", "stock agregar ibuprofeno 10", "stock bajar ibuprofeno 3",
+        "stock ver ibuprofeno", "programar retiro losartan 2030-01-05 10:00",
+        "programar ciclo metformina 2030-01-05 10:00 cada 30", "mis retiros",
+        "retire losartan si", "vincular_adherencia_si", "med_freq_row_2", "07:00",
+    ],
+    "guia_ruta": [
+        "guia de ruta", "route_type_row_1", "route_ges_row_1", "route_ges_reminder_btn_1",
+        "guia de ruta", "route_type_row_2", "route_exams_fast_btn_1", "route_save_btn_2",
+        "guia de ruta", "route_type_row_3", "route_rx_btn_1", "route_close_btn_1",
+        "guia de ruta", "route_type_row_4", "route_urgent_btn_1", "route_save_btn_1",
+    ],
+    "orientacion": [
+        "urgente", "orientacion de sintomas", "orientacion_categorias_row_10",
+        "orientacion_categorias_row_1", "tengo tos seca y fiebre y dolores musculares",
+        "orientacion_respiratorio_confirmacion_btn_1",
+    ],
+}
+
+
+def _webhook(number: str, name: str, texto: str, message_id: str) -> dict:
+    """Cuerpo de webhook de la Cloud API con un mensaje (texto, lista o botón)."""
+    if "_row_" in texto:
+        message = {"type": "interactive",
+                   "interactive": {"type": "list_reply", "list_reply": {"id": texto, "title": texto[:24]}}}
+    elif "_btn_" in texto:
+        message = {"type": "interactive",
+                   "interactive": {"type": "button_reply", "button_reply": {"id": texto, "title": texto[:20]}}}
+    else:
+        message = {"type": "text", "text": {"body": texto}}
+    message.update({"from": number, "id": message_id, "timestamp": str(int(time.time()))})
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"id": "bench", "changes": [{"field": "messages", "value": {
+            "messaging_product": "whatsapp",
+            "metadata": {"display_phone_number": "56900000000", "phone_number_id": "bench"},
+            "contacts": [{"wa_id": number, "profile": {"name": name}}],
+            "messages": [message],
+        }}]}],
+    }
+
+
+def _cuerpos_sinteticos(rondas: int, corrida: str) -> dict:
+    """{ number: [cuerpo, ...] }: cada ronda repite todas las conversaciones con números nuevos."""
+    por_numero = {}
+    for r in range(rondas):
+        for c, (flujo, mensajes) in enumerate(CONVERSACIONES.items()):
+            number = f"569{corrida}{r:05d}{c:02d}"
+            por_numero[number] = [
+                _webhook(number, "Bench", texto, f"wamid.{number}.{i}") for i, texto in enumerate(mensajes)
+            ]
+    return por_numero
+
+
+def _cuerpos_archivo(path: str) -> dict:
+    """JSONL con un cuerpo de webhook por línea; se agrupa por el primer remitente."""
+    por_numero = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            body = json.loads(line)
+            mensajes = services.extraer_mensajes(body)
+            if mensajes:
+                por_numero.setdefault(mensajes[0][1], []).append(body)
+    return por_numero
+
+
+class TransporteMemoria:
+    """Reemplaza transport.post: responde 200 al instante y cuenta payloads."""
+
+    def __init__(self):
+        self.enviados = 0
+        self._lock = threading.Lock()
+
+    def post(self, data) -> transport.Respuesta:
+        with self._lock:
+            self.enviados += 1
+        return transport.Respuesta(200, '{"messages":[{"id":"wamid.bench"}]}', None, 0.0)
+
+
+def _atender(body):
+    for text, number, message_id, name in services.extraer_mensajes(body):
+        services.administrar_chatbot(text, number, message_id, name)
+
+
+def _replay(por_numero: dict, hilos: int):
+    """Reproduce con N hilos; devuelve (latencias en s por cuerpo, mensajes, segundos)."""
+    carriles = [[] for _ in range(hilos)]
+    for i, cuerpos in enumerate(por_numero.values()):
+        carriles[i % hilos].extend(cuerpos)
+    latencias = [[] for _ in range(hilos)]
+
+    def worker(cuerpos, lat):
+        for body in cuerpos:
+            t0 = time.perf_counter()
+            _atender(body)
+            lat.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=worker, args=(c, l)) for c, l in zip(carriles, latencias)]
+    t0 = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    segundos = time.perf_counter() - t0
+    mensajes = sum(len(services.extraer_mensajes(b)) for cs in por_numero.values() for b in cs)
+    return sorted(x for lat in latencias for x in lat), mensajes, segundos
+
+
+def _asignaciones(por_numero: dict):
+    """Un hilo bajo tracemalloc: (KB pico por cuerpo, bloques retenidos por cuerpo)."""
+    cuerpos = [b for cs in por_numero.values() for b in cs]
+    tracemalloc.start()
+    bloques0 = sys.getallocatedblocks()
+    picos = 0
+    for body in cuerpos:
+        tracemalloc.reset_peak()
+        antes = tracemalloc.get_traced_memory()[0]
+        _atender(body)
+        picos += tracemalloc.get_traced_memory()[1] - antes
+    retenidos = sys.getallocatedblocks() - bloques0
+    tracemalloc.stop()
+    return picos / len(cuerpos) / 1024, retenidos / len(cuerpos)
+
+
+def _pct(valores, p: float) -> float:
+    return valores[min(len(valores) - 1, int(len(valores) * p))] * 1000
+
+
+def _esperar_envios(timeout: float = 10.0) -> bool:
+    q = outbound.get_outbound()
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        st = q.stats()
+        if not st["delayed"] and not any(st["depth"]):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def bench_replay(args):
+    transporte = TransporteMemoria()
+    transport.post = transporte.post
+
+    def cuerpos(corrida):
+        services.FLUJOS.almacen.limpiar()
+        if args.archivo:
+            return _cuerpos_archivo(args.archivo)
+        return _cuerpos_sinteticos(args.rondas, corrida)
+
+    # Los print() de los handlers se siguen formateando, pero no ensucian la tabla
+    silencio = open(os.devnull, "w")
+
+    # Calentamiento: compila rutas, abre el outbox y arranca los emisores
+    with contextlib.redirect_stdout(silencio):
+        _replay(_cuerpos_sinteticos(1, "99"), 1)
+        _esperar_envios()
+
+    print(f"{'hilos':>5} {'mensajes':>9} {'msg/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for corrida, hilos in enumerate(args.hilos):
+        with contextlib.redirect_stdout(silencio):
+            lat, mensajes, segundos = _replay(cuerpos(f"{corrida:02d}"), hilos)
+        print(f"{hilos:5} {mensajes:9} {mensajes / segundos:9.0f} "
+              f"{_pct(lat, 0.50):8.3f} {_pct(lat, 0.95):8.3f} {_pct(lat, 0.99):8.3f}")
+
+    with contextlib.redirect_stdout(silencio):
+        kb, bloques = _asignaciones(cuerpos("98"))
+    print(f"\nmemoria (1 hilo, tracemalloc): {kb:.1f} KB pico por mensaje, "
+          f"{bloques:.1f} bloques retenidos por mensaje")
+    drenado = _esperar_envios()
+    print(f"payloads entregados al transporte en memoria: {transporte.enviados}"
+          + ("" if drenado else " (cola sin drenar)"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks locales de MedicAI")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("plantillas", help="plantillas pre-serializadas vs builders json.dumps")
+    p.add_argument("-n", type=int, default=20000, help="iteraciones por caso")
+    p.set_defaults(func=bench_plantillas)
+
+    p = sub.add_parser("rutas", help="costo de resolver la ruta de un mensaje")
+    p.add_argument("-n", type=int, default=20000, help="iteraciones por caso (mensajes con --paridad)")
+    p.add_argument("--paridad", action="store_true",
+                   help="compara con la cadena if/elif original (requiere git)")
+    p.add_argument("--rev", help="revisión de git con la cadena original")
+    p.set_defaults(func=bench_rutas)
+
+    p = sub.add_parser("intenciones", help="Aho-Corasick vs escaneos `in` en mensajes largos")
+    p.add_argument("-n", type=int, default=2000, help="iteraciones por caso")
+    p.set_defaults(func=bench_intenciones)
+
+    p = sub.add_parser("normalizacion", help="textnorm (ASCII/tabla/LRU) vs normalize_text original")
+    p.add_argument("-n", type=int, default=20000, help="iteraciones por caso")
+    p.set_defaults(func=bench_normalizacion)
+
+    p = sub.add_parser("paridad", help="motor de diagnóstico compilado vs salidas if/elif congeladas")
+    p.add_argument("-n", type=int, default=2000, help="textos evaluados por categoría al medir")
+    p.add_argument("--rev", help="revisión de git con las funciones originales")
+    p.add_argument("--congelar", action="store_true",
+                   help="regenera el fixture desde las funciones originales (requiere git)")
+    p.add_argument("--casos", type=int, default=500, help="textos por categoría del fixture")
+    p.set_defaults(func=bench_paridad)
+
+    p = sub.add_parser("triaje", help="índice invertido de síntomas vs recorrer cada categoría")
+    p.add_argument("-n", type=int, default=5000, help="iteraciones por caso")
+    p.set_defaults(func=bench_triaje)
+
+    p = sub.add_parser("puntaje", help="puntaje diferencial: numpy vs máscaras de bits")
+    p.add_argument("-n", type=int, default=2000, help="iteraciones del caso de un mensaje")
+    p.add_argument("--lote", type=int, default=1000, help="mensajes del lote")
+    p.set_defaults(func=bench_puntaje)
+
+    p = sub.add_parser("fuzzy", help="corrección de tipeos en síntomas: costo y aciertos")
+    p.add_argument("-n", type=int, default=2000, help="iteraciones por caso (con LRU)")
+    p.add_argument("--umbral", type=float, default=0.8, help="similitud mínima por palabra")
+    p.set_defaults(func=bench_fuzzy)
+
+    p = sub.add_parser("sintomas", help="IDs canónicos: una extracción vs releer el texto")
+    p.add_argument("-n", type=int, default=5000, help="iteraciones por caso")
+    p.add_argument("--lote", type=int, default=5000, help="textos aleatorios")
+    p.set_defaults(func=bench_sintomas)
+
+    p = sub.add_parser("replay", help="reproduce webhooks de todos los flujos con transporte en memoria")
+    p.add_argument("--rondas", type=int, default=20, help="repeticiones de cada conversación sintética")
+    p.add_argument("--hilos", type=int, nargs="+", default=[1, 4], help="corridas con N hilos")
+    p.add_argument("--archivo", help="JSONL de cuerpos de webhook grabados (en vez de los sintéticos)")
+    p.set_defaults(func=bench_replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
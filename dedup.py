@@ -0,0 +1,99 @@
+# dedup.py
+import threading
+import time
+from collections import OrderedDict
+
+import sett
+from services import db_conn
+
+# ===================================================================
+# DEDUPLICACIÓN DE MENSAJES ENTRANTES (idempotencia por messageId)
+# ===================================================================
+# Meta reenvía el webhook si nuestro 200 tarda; cada reintento volvería a
+# mover las máquinas de estado. Primero se consulta un LRU en memoria
+# (O(1)); si no está, un INSERT OR IGNORE en SQLite decide entre procesos
+# de gunicorn cuál es la primera entrega.
+
+
+class MessageDedup:
+    """LRU con TTL en memoria respaldado por la tabla seen_messages."""
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._cache = OrderedDict()   # { message_id: seen_at }
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._inserts = 0
+        with db_conn() as cx:
+            cx.execute(
+                """
+                CREATE TABLE IF NOT EXISTS seen_messages (
+                    message_id TEXT PRIMARY KEY,
+                    seen_at REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+
+    def _conn(self):
+        cx = getattr(self._local, "cx", None)
+        if cx is None:
+            cx = self._local.cx = db_conn()
+        return cx
+
+    def _remember(self, message_id: str, now: float):
+        self._cache[message_id] = now
+        self._cache.move_to_end(message_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def first_time(self, message_id: str) -> bool:
+        """True solo para la primera entrega de message_id (dentro del TTL)."""
+        now = time.time()
+        with self._lock:
+            seen_at = self._cache.get(message_id)
+            if seen_at is not None and now - seen_at < self.ttl:
+                self._cache.move_to_end(message_id)
+                return False
+
+        cx = self._conn()
+        with cx:
+            cur = cx.execute(
+                "INSERT OR IGNORE INTO seen_messages(message_id, seen_at) VALUES(?,?)",
+                (message_id, now),
+            )
+            nuevo = cur.rowcount == 1
+            if not nuevo:
+                # Ya existe: si expiró el TTL se trata como mensaje nuevo
+                cur = cx.execute(
+                    "UPDATE seen_messages SET seen_at=? WHERE message_id=? AND seen_at < ?",
+                    (now, message_id, now - self.ttl),
+                )
+                nuevo = cur.rowcount == 1
+            self._inserts += 1
+            if self._inserts % 500 == 0:
+                cx.execute("DELETE FROM seen_messages WHERE seen_at < ?", (now - self.ttl,))
+
+        with self._lock:
+            self._remember(message_id, now)
+        return nuevo
+
+    def forget(self, message_id: str):
+        """Olvida un id (p.ej. si no se pudo encolar y Meta debe reintentar)."""
+        with self._lock:
+            self._cache.pop(message_id, None)
+        cx = self._conn()
+        with cx:
+            cx.execute("DELETE FROM seen_messages WHERE message_id=?", (message_id,))
+
+
+_DEDUP = None
+_DEDUP_LOCK = threading.Lock()
+
+
+def get_dedup() -> MessageDedup:
+    global _DEDUP
+    with _DEDUP_LOCK:
+        if _DEDUP is None:
+            _DEDUP = MessageDedup(sett.DEDUP_TTL_SECONDS, sett.DEDUP_CACHE_SIZE)
+        return _DEDUP
@@ -0,0 +1,480 @@
+# diagnostics.py
+from collections import namedtuple
+from itertools import product
+
+import textnorm
+
+# ===================================================================
+# MOTOR DE REGLAS DE DIAGNÓSTICO (tabla declarativa compilada a bits)
+# ===================================================================
+# Las reglas de cada categoría se declaran en REGLAS, en el mismo orden
+# que tenían las cadenas if/elif de diagnostico_<categoria> (gana la
+# primera que se cumple). Condición de una regla:
+#   - tupla de grupos que deben cumplirse todos (AND);
+#   - un grupo es un término o una tupla de términos alternativos (OR);
+#   - una lista de tuplas es un OR de condiciones completas.
+# Los términos se copiaron tal cual, incluidas las variantes con tilde,
+# para dar el mismo resultado que antes con cualquier texto.
+#
+# Al importar, cada categoría se compila: un bit por término distinto y
+# cada regla se expande a cláusulas AND (máscara requerida). Evaluar =
+# probar las cláusulas en orden (`m & req == req`) sobre la máscara de
+# términos presentes. Con la máscara ya extraída, evaluar_mascara() no
+# vuelve a mirar el texto.
+# Para texto suelto, evaluar(texto) no extrae la máscara: al compilar se
+# genera una función con la misma forma que la cadena original
+# (`if ("a" in texto) and ("b" in texto or "c" in texto): return ...`),
+# que se detiene en el primer término ausente y en la primera regla que se
+# cumple. Cuesta lo mismo que las funciones if/elif originales; un bucle
+# sobre las cláusulas o extraer la máscara completa era 2-3 veces más
+# lento (medido con `python bench.py paridad`, que además compara el
+# resultado contra las funciones originales).
+#
+# La conversación no pasa texto: evaluar_sintomas() recibe los IDs
+# canónicos que ya extrajo symptoms.py (términos normalizados, sin tildes).
+# Cada ID enciende los bits de todas sus variantes, así "congestion nasal"
+# cumple también las reglas escritas con "congestión nasal".
+
+Regla = namedtuple("Regla", "si diagnostico nivel recomendacion")
+
+SIN_DIAGNOSTICO = (None, None, None)
+
+REGLAS = {
+    "respiratorio": (
+        Regla(("tos leve", "estornudos", "congestion nasal"),
+              "Resfriado común",
+              "Autocuidado en casa",
+              "Mantén reposo e hidratación, aprovecha líquidos calientes y, si tienes congestión, usa solución salina nasal. Usa mascarilla si estás con personas de riesgo."),
+        Regla(("tos seca", "fiebre", "dolores musculares"),
+              "Gripe (influenza)",
+              "Autocuidado + control",
+              "Reposa, mantén una buena hidratación y utiliza paracetamol o ibuprofeno según prospecto. Controla tu temperatura cada 6 h."),
+        Regla(("dolor al tragar", "fiebre", "garganta inflamada"),
+              "Faringitis / Amigdalitis / Laringitis",
+              "Requiere atención si persiste",
+              "Haz gárgaras con agua tibia y sal, hidratación abundante. Si el dolor dura más de 48 h o hay placas en la garganta, consulta al médico para posible tratamiento antibiótico."),
+        Regla(("tos persistente", "flema", "pecho apretado"),
+              "Bronquitis",
+              "Medir gravedad",
+              "Evita irritantes (humo, polvo), mantente hidratado y usa expectorantes de venta libre. Si empeora la dificultad para respirar o la fiebre persiste, acude al médico."),
+        Regla(("fiebre alta", "dificultad respiratoria"),
+              "Neumonía",
+              "Urgencia médica",
+              "Esta combinación sugiere neumonía: acude de inmediato a un servicio de urgencias u hospital."),
+        Regla(("opresión torácica", "silbidos"),
+              "Asma",
+              "Evaluar crisis",
+              "Si tienes salbutamol, úsalo según indicaciones. Si no mejora en 15 min o empeora la respiración, llama al 131 o acude a urgencias."),
+        Regla(("estornudos", "congestión nasal", "picazón"),
+              "Rinitis alérgica",
+              "Tratamiento ambulatorio",
+              "Evita alérgenos (polvo, pólenes), antihistamínicos orales y lavados nasales con solución salina. Consulta a tu alergólogo si persiste."),
+        Regla(("tos seca", "fiebre", "pérdida de olfato"),
+              "COVID-19",
+              "Sospecha, test y aislamiento",
+              "Aíslate y haz prueba PCR lo antes posible. Monitorea tus síntomas cada día y consulta si aparece dificultad respiratoria."),
+    ),
+    "bucal": (
+        Regla(("dolor punzante", "sensibilidad"),
+              "Caries",
+              "Requiere atención odontológica",
+              "Mantén una higiene bucal rigurosa (cepillado y uso de hilo dental), evita alimentos muy ácidos o muy fríos/calientes y consulta a un odontólogo para tratar la cavidad."),
+        Regla(("encías inflamadas", "sangrado", "mal aliento"),
+              "Gingivitis",
+              "Higiene mejorada + control",
+              "Mejora tu higiene bucal con cepillado suave dos veces al día, uso de hilo dental y enjuagues antisépticos. Si los síntomas persisten tras una semana, visita a tu dentista."),
+        Regla(("encías retraídas", "dolor al masticar", "movilidad"),
+              "Periodontitis",
+              "Atención odontológica urgente",
+              "Acude al odontólogo de inmediato; podrías necesitar raspado y alisado radicular para frenar la pérdida de tejido periodontal."),
+        Regla(("llagas", "pequeñas", "dolorosas"),
+              "Aftas bucales",
+              "Manejo local + observar",
+              "Evita alimentos ácidos o picantes, enjuaga con agua tibia y sal, y utiliza gel o crema tópica para aliviar el dolor. Si duran más de 2 semanas, consulta a tu dentista."),
+        Regla(("dolor mandibular", "tensión", "rechinar"),
+              "Bruxismo",
+              "Uso de férula / evaluación",
+              "Considera usar una férula de descarga nocturna, técnicas de relajación y fisioterapia mandibular. Evalúa con un odontólogo o especialista en ATM."),
+    ),
+    "infeccioso": (
+        Regla(("ardor al orinar", "fiebre", "orina frecuente"),
+              "Infección urinaria",
+              "Atención médica no urgente",
+              "Hidrátate abundantemente, evita irritantes (café, alcohol) y consulta al médico si persiste o hay sangre en la orina."),
+        Regla(("diarrea", "vómitos", "dolor abdominal"),
+              "Gastroenteritis",
+              "Hidratación + reposo",
+              "Mantén reposo, usa soluciones de rehidratación oral y observa si hay signos de deshidratación. Acude al médico si empeora."),
+        Regla(("dolor estomacal persistente", "náuseas"),
+              "Infección por Helicobacter pylori",
+              "Evaluación médica necesaria",
+              "Solicita pruebas de H. pylori y consulta con tu médico para iniciar tratamiento antibiótico y protector gástrico."),
+        Regla(("fiebre", "erupción", "ampollas"),
+              "Varicela",
+              "Reposo + aislamiento",
+              "Mantén reposo, controla la fiebre con paracetamol y evita rascarte. Aísla hasta que todas las ampollas se sequen."),
+        Regla(("manchas rojas", "tos", "conjuntivitis"),
+              "Sarampión",
+              "Evaluación médica urgente",
+              "Acude de inmediato al médico, confirma tu estado de vacunación y evita el contacto con personas susceptibles."),
+        Regla(("erupción leve", "inflamación ganglionar"),
+              "Rubéola",
+              "Observación + test",
+              "Realiza prueba de rubéola y evita el contacto con embarazadas. Sigue las indicaciones de tu médico."),
+        Regla(("dolor en mejillas", "fiebre"),
+              "Paperas",
+              "Cuidado en casa + control",
+              "Aplica calor suave en la zona, toma analgésicos según indicación y descansa. Consulta si hay complicaciones."),
+        Regla(("cansancio", "piel amarilla", "fiebre"),
+              "Hepatitis A/B/C",
+              "Evaluación inmediata y pruebas de laboratorio",
+              "Solicita pruebas de función hepática y marcadores virales. Acude al médico cuanto antes."),
+    ),
+    "cardiovascular": (
+        Regla((("presion", "presión"), ("sin síntomas", "alta")),
+              "Hipertensión arterial",
+              "Control ambulatorio",
+              "Controla tu presión arterial regularmente, lleva una dieta baja en sal, haz ejercicio moderado y sigue las indicaciones de tu médico."),
+        Regla(("cansancio", "falta de aire", "hinchaz"),
+              "Insuficiencia cardíaca",
+              "Evaluación clínica pronta",
+              "Monitorea tu peso y la hinchazón, reduce la ingesta de líquidos si está indicado y consulta a un cardiólogo lo antes posible."),
+        Regla(("palpitaciones",),
+              "Arritmias",
+              "Requiere electrocardiograma",
+              "Agenda un electrocardiograma y consulta con un especialista en cardiología para evaluar tu ritmo cardíaco."),
+        Regla(("dolor en el pecho", "brazo izquierdo", ("sudor frio", "sudor frío")),
+              "Infarto agudo al miocardio",
+              "Urgencia médica inmediata",
+              "Llama a emergencias (SAMU 131) de inmediato o acude al hospital más cercano. No esperes."),
+        Regla(("dolor al caminar", "desaparece"),
+              "Aterosclerosis (angina)",
+              "Evaluación médica en menos de 24 hrs",
+              "Evita esfuerzos intensos hasta la valoración, y consulta con un cardiólogo para pruebas de perfusión o angiografía."),
+    ),
+    "metabolico": (
+        Regla(("sed excesiva", "orina frecuentemente", "pérdida de peso"),
+              "Diabetes tipo 1",
+              "Evaluación médica urgente",
+              "Acude a un centro de salud para medición de glucosa en sangre y valoración endocrinológica inmediata."),
+        Regla(("cansancio", "visión borrosa", "sobrepeso"),
+              "Diabetes tipo 2",
+              "Control y exámenes de laboratorio",
+              "Realiza un hemograma de glucosa y HbA1c, ajusta dieta y actividad física, y programa consulta con endocrinología."),
+        Regla(("piel seca", ("intolerancia al frio", "frío")),
+              "Hipotiroidismo",
+              "Control endocrinológico",
+              "Solicita perfil de tiroides (TSH, T4) y ajusta tu tratamiento si ya estás en seguimiento."),
+        Regla(("nerviosismo", ("sudoracion", "sudoración"), "pérdida de peso"),
+              "Hipertiroidismo",
+              "Evaluación clínica y TSH",
+              "Pide análisis de tiroides y consulta con endocrinólogo para manejo con antitiroideos o terapia con yodo."),
+        Regla(("circunferencia abdominal", ("presion alta", "presión alta")),
+              "Síndrome metabólico",
+              "Evaluación de riesgo cardiovascular",
+              "Controla tu peso, presión y lípidos. Programa un chequeo cardiovascular completo."),
+        Regla(("colesterol", "antecedentes"),
+              "Colesterol alto",
+              "Prevención + examen de perfil lipídico",
+              "Realiza un perfil de lípidos, ajusta dieta baja en grasas saturadas y considera estatinas si lo indica tu médico."),
+        Regla(("dolor en la articulación", "dedo gordo"),
+              "Gota",
+              "Evaluación médica ambulatoria",
+              "Confirma con ácido úrico en sangre, modera el consumo de purinas y consulta con reumatología."),
+    ),
+    "neurologico": (
+        Regla(("dolor de cabeza", ("pulsatil", "pulsátil"), ("nauseas", "náuseas"), "fotofobia"),
+              "Migraña",
+              "Manejo con analgésicos + control",
+              "Descansa en ambiente oscuro, utiliza triptanes o analgésicos según prescripción y lleva un diario de desencadenantes."),
+        Regla(("dolor de cabeza", "estrés"),
+              "Cefalea tensional",
+              "Autocuidado + relajación",
+              "Aplica compresas frías o calientes, practica técnicas de relajación y corrige postura."),
+        Regla(("sacudidas", "desmayo", ("confusion", "confusión")),
+              "Epilepsia",
+              "Evaluación neurológica urgente",
+              "Registra los episodios y consulta con neurología para EEG y ajuste de medicación anticonvulsivante."),
+        Regla(("temblores", "lentitud", "rigidez"),
+              "Parkinson",
+              "Evaluación neurológica",
+              "Agrega fisioterapia y consulta con neurología para iniciar tratamiento con levodopa o agonistas."),
+        Regla((("perdida de memoria", "pérdida de memoria"), "desorientación"),
+              "Alzheimer",
+              "Evaluación por especialista",
+              "Realiza pruebas cognitivas y consulta con neurología o geriatría para manejo multidisciplinario."),
+        Regla(("fatiga", "hormigueos", ("vision borrosa", "visión borrosa")),
+              "Esclerosis múltiple",
+              "Derivación neurológica",
+              "Consulta con neurología para RMN cerebral y lumbar y comenzar terapia modificadora de enfermedad."),
+        Regla(("dolor facial", "punzante"),
+              "Neuralgia del trigémino",
+              "Tratamiento farmacológico",
+              "Inicia carbamazepina o gabapentina según indicación médica y valora bloqueo del nervio si persiste."),
+    ),
+    "musculoesqueletico": (
+        Regla(("dolor en espalda baja", "sin golpe"),
+              "Lumbalgia",
+              "Reposo + fisioterapia",
+              "Aplica calor local, evita levantar pesos y realiza estiramientos suaves con guía de kinesiología."),
+        Regla(("dolor articular", ("inflamacion", "inflamación"), "rigidez"),
+              "Artritis",
+              "Evaluación médica reumatológica",
+              "Solicita marcadores inflamatorios (VSG, PCR) y consulta con reumatología para manejo con AINEs o DMARDs."),
+        Regla(("dolor articular", "uso", ("sin inflamacion", "sin inflamación")),
+              "Artrosis",
+              "Ejercicio suave + control",
+              "Refuerza musculatura con ejercicios de bajo impacto y considera condroprotectores si lo indica tu médico."),
+        Regla(("dolor muscular generalizado", "fatiga"),
+              "Fibromialgia",
+              "Manejo crónico integral",
+              "Combina ejercicio aeróbico suave, terapia cognitivo‑conductual y manejo del dolor con tu médico."),
+        Regla(("dolor al mover", "sobreuso"),
+              "Tendinitis",
+              "Reposo local + analgésicos",
+              "Aplica hielo, inmoviliza la zona en reposo y toma AINEs según indicación médica."),
+        Regla(("dolor localizado", "bursa"),
+              "Bursitis",
+              "Reposo + hielo + evaluación",
+              "Aplica frío local y consulta con ortopedia o fisiatría si persiste para posible infiltración."),
+        Regla(("torcedura",),
+              "Esguince",
+              "Reposo, hielo, compresión, elevación (RICE)",
+              "Sujeta con venda elástica, eleva la zona y reevalúa en 48 h con un profesional."),
+    ),
+    "salud_mental": (
+        Regla(("ansiedad", "dificultad para relajarse"),
+              "Ansiedad generalizada",
+              "Apoyo psicoemocional + técnicas de autorregulación",
+              "Práctica respiración diafragmática, mindfulness y considera terapia cognitivo‑conductual."),
+        Regla(("tristeza persistente", "pérdida de interés", "fatiga"),
+              "Depresión",
+              "Apoyo clínico + evaluación emocional",
+              "Consulta con psiquiatría o psicología para evaluar terapia y, si es necesario, antidepresivos."),
+        Regla(("cambios extremos", "hiperactividad"),
+              "Trastorno bipolar",
+              "Evaluación profesional integral",
+              "Valora estabilizadores del ánimo con psiquiatría y seguimiento estrecho."),
+        Regla(("ataques de pánico", "miedo a morir"),
+              "Trastorno de pánico",
+              "Manejo con técnicas de respiración + orientación",
+              "Aprende respiración controlada y considera ISRS o benzodiacepinas en pauta corta."),
+        Regla(("flashbacks", "hipervigilancia"),
+              "TEPT",
+              "Acompañamiento psicológico",
+              "Terapia de exposición y EMDR con psicólogo especializado."),
+        Regla([("compulsiones",), ("pensamientos repetitivos",)],
+              "TOC",
+              "Detección temprana + derivación especializada",
+              "Terapia cognitivo‑conductual con ERP y, si hace falta, ISRS a dosis altas."),
+    ),
+    "dermatologico": (
+        Regla(("granos", ("cara", "pecho", "espalda")),
+              "Acné",
+              "Manejo domiciliario + higiene",
+              "Limpia con jabón suave, evita productos comedogénicos y consulta dermatología si persiste."),
+        Regla(("piel seca", "enrojecida", ("picazon", "picazón")),
+              "Dermatitis atópica",
+              "Hidratación + evitar alérgenos",
+              "Emuslivos frecuentes, evita jabones agresivos y considera corticoides tópicos si lo indica tu médico."),
+        Regla(("placas rojas", "escamas", "engrosadas"),
+              "Psoriasis",
+              "Evaluación dermatológica",
+              "Consulta dermatológica para valorar calcipotriol o fototerapia."),
+        Regla(("ronchas", "aparecen", ("rapido", "rápido")),
+              "Urticaria",
+              "Posible alergia / estrés",
+              "Antihistamínicos orales y evita desencadenantes identificados."),
+        Regla((("lesion redonda", "lesión redonda"), "borde rojo"),
+              "Tiña",
+              "Antimicótico tópico",
+              "Aplica clotrimazol o terbinafina localmente durante 2 semanas."),
+        Regla(("ampolla", ("labio", "genitales")),
+              "Herpes simple",
+              "Antiviral tópico u oral",
+              "Inicia aciclovir tópico o valaciclovir oral según prescripción."),
+        Regla(("bultos", "duros"),
+              "Verrugas",
+              "Tratamiento tópico o crioterapia",
+              "Aplica ácido salicílico o valora crioterapia con dermatólogo."),
+    ),
+    "otorrinolaringologico": (
+        Regla(("ojos rojos", ("picazon", "picazón"), "secrecion"),
+              "Conjuntivitis",
+              "Higiene + evitar contacto",
+              "Lava con soluciones salinas y evita frotar. Consulta si hay secreción purulenta."),
+        Regla((("dolor de oido", "dolor de oído"), "fiebre", "tapado"),
+              "Otitis",
+              "Evaluación médica (especialmente en niños)",
+              "Consulta pronto para antibióticos si está indicado y analgésicos para el dolor."),
+        Regla(("presion en cara", "secrecion nasal espesa", "dolor de cabeza"),
+              "Sinusitis",
+              "Tratamiento ambulatorio",
+              "Descongestionantes y antibiótico si persiste más de 10 días."),
+        Regla((("vision borrosa", "visión borrosa"), "halos", "dolor ocular"),
+              "Glaucoma",
+              "Evaluación urgente",
+              "Agudeza visual y presión intraocular con oftalmólogo de inmediato."),
+        Regla(("dificultad para ver", ("vision nublada", "visión nublada")),
+              "Cataratas",
+              "Derivación oftalmológica",
+              "Consulta oftalmológica para valorar cirugía de cataratas."),
+        Regla([("zumbido",), ("disminucion auditiva",), ("disminución auditiva",)],
+              "Pérdida auditiva",
+              "Evaluación ORL o audiometría",
+              "Realiza audiometría y consulta con otorrinolaringólogo para rehabilitación auditiva."),
+    ),
+    "ginecologico": (
+        Regla(("dolor al orinar", ("orina turbia", "turbia"), "fiebre"),
+              "Cistitis",
+              "Hidratación + atención médica si persiste",
+              "Bebe abundante agua y consulta si hay sangre o dolor severo."),
+        Regla(("flujo anormal", ("picazon", "picazón", "ardor")),
+              "Vaginitis",
+              "Evaluación ginecológica ambulatoria",
+              "Toma muestra de flujo y pide tratamiento según cultivo."),
+        Regla((("dolor pelvico", "dolor pélvico"), ("menstruacion dolorosa", "menstruación dolorosa")),
+              "Endometriosis",
+              "Control ginecológico recomendado",
+              "Ultrasonido pélvico y manejo hormonal con tu ginecólogo."),
+        Regla(("irritabilidad", "dolor mamario", "cambios premenstruales"),
+              "Síndrome premenstrual (SPM)",
+              "Manejo con hábitos y control hormonal",
+              "Lleva registro de tu ciclo, dieta equilibrada y valora anticonceptivos hormonales."),
+        Regla([("dolor testicular",), ("dolor", "perineal")],
+              "Prostatitis",
+              "Evaluación médica inmediata (urología)",
+              "Antibióticos según urocultivo y manejo del dolor con antiinflamatorios."),
+    ),
+    "digestivo": (
+        Regla(("acidez", "ardor", ("comer", "aliment")),
+              "Reflujo gastroesofágico (ERGE)",
+              "Control dietético + posible medicación",
+              "Evita alimentos grasos, eleva la cabecera de la cama y considera IBP según médico."),
+        Regla(("diarrea", "dolor abdominal"),
+              "Colitis",
+              "Observación + evitar irritantes",
+              "Hidratación con sales y dieta BRAT. Consulta si hay sangre o fiebre alta."),
+        Regla((("evacuaciones dificiles", "evacuaciones difíciles"), "dolor abdominal"),
+              "Estreñimiento",
+              "Hidratación + fibra + hábitos",
+              "Aumenta fibra y agua, realiza ejercicio y valora laxantes suaves."),
+        Regla(("dolor al evacuar", ("sangrado", "sangre"), ("picazon", "picazón")),
+              "Hemorroides",
+              "Higiene + dieta + evaluación médica si persiste",
+              "Baños de asiento, crema de hidrocortisona y dieta rica en fibra."),
+        Regla(("gases", ("hinchazon", "hinchazón"), "diarrea", ("lacteos", "lácteos")),
+              "Intolerancia a la lactosa",
+              "Evitar lácteos + prueba de tolerancia",
+              "Sustituye por leches sin lactosa y realiza test de hidrógeno espirado."),
+    ),
+}
+
+
+def _conjunciones(si):
+    """Condición en forma normal disyuntiva: una tupla de términos por cláusula."""
+    for conjuncion in (si if isinstance(si, list) else [si]):
+        yield from product(*((g,) if isinstance(g, str) else g for g in conjuncion))
+
+
+def _compilar_texto(nombre: str, reglas):
+    """Función evaluar(texto) con las reglas escritas como la cadena if/elif original."""
+    lineas = ["def evaluar(texto):", "    texto = texto.lower()"]
+    espacio = {"SIN_DIAGNOSTICO": SIN_DIAGNOSTICO}
+    for i, regla in enumerate(reglas):
+        espacio[f"R{i}"] = (regla.diagnostico, regla.nivel, regla.recomendacion)
+        condicion = " or ".join(
+            "(" + " and ".join(
+                "(" + " or ".join(f"{t!r} in texto" for t in ((g,) if isinstance(g, str) else g)) + ")"
+                for g in conjuncion
+            ) + ")"
+            for conjuncion in (regla.si if isinstance(regla.si, list) else [regla.si])
+        )
+        lineas += [f"    if {condicion}:", f"        return R{i}"]
+    lineas.append("    return SIN_DIAGNOSTICO")
+    exec(compile("\n".join(lineas), f"<diagnostics.REGLAS[{nombre!r}]>", "exec"), espacio)
+    return espacio["evaluar"]
+
+
+class Categoria:
+    """Reglas de una categoría compiladas a máscaras de bits."""
+
+    __slots__ = ("nombre", "bits", "sintomas", "clausulas", "_terminos", "evaluar")
+
+    def __init__(self, nombre: str, reglas):
+        self.nombre = nombre
+        self.bits = {}            # { término: bit }
+        clausulas = []            # [(máscara requerida, resultado)] en orden
+        for regla in reglas:
+            resultado = (regla.diagnostico, regla.nivel, regla.recomendacion)
+            for terminos in _conjunciones(regla.si):
+                req = 0
+                for t in terminos:
+                    req |= self.bits.setdefault(t, 1 << len(self.bits))
+                # si contiene a una cláusula anterior, nunca llega a ganar
+                if any(previa & req == previa for previa, _ in clausulas):
+                    continue
+                clausulas.append((req, resultado))
+        self.clausulas = tuple(clausulas)
+        self._terminos = tuple(self.bits.items())
+        # evaluar(texto) -> (diagnóstico, nivel, recomendación) de la primera regla
+        self.evaluar = _compilar_texto(nombre, reglas)
+        self.sintomas = {}        # { ID canónico: bits de sus variantes }
+        for termino, bit in self._terminos:
+            sintoma = textnorm.normalizar(termino)
+            self.sintomas[sintoma] = self.sintomas.get(sintoma, 0) | bit
+
+    def mascara(self, texto: str) -> int:
+        """Bits de los términos presentes en el texto."""
+        texto = texto.lower()
+        m = 0
+        for termino, bit in self._terminos:
+            if termino in texto:
+                m |= bit
+        return m
+
+    def evaluar_mascara(self, m: int):
+        """(diagnóstico, nivel, recomendación) de la primera regla que se cumple."""
+        if m:
+            for req, resultado in self.clausulas:
+                if m & req == req:
+                    return resultado
+        return SIN_DIAGNOSTICO
+
+    def mascara_sintomas(self, sintomas) -> int:
+        """Bits a partir de IDs canónicos ya extraídos (sin volver al texto)."""
+        bits = self.sintomas
+        m = 0
+        for sintoma in sintomas:
+            m |= bits.get(sintoma, 0)
+        return m
+
+    def evaluar_sintomas(self, sintomas):
+        return self.evaluar_mascara(self.mascara_sintomas(sintomas))
+
+    def __repr__(self):
+        return f"<Categoria {self.nombre}: {len(self.bits)} términos, {len(self.clausulas)} cláusulas>"
+
+
+CATEGORIAS = {nombre: Categoria(nombre, reglas) for nombre, reglas in REGLAS.items()}
+
+# Categoría tal como llega en los IDs de la conversación → clave de REGLAS
+ALIAS = {"saludmental": "salud_mental"}
+
+
+def obtener(categoria: str):
+    """Categoria compilada (acepta los alias de la conversación), o None."""
+    return CATEGORIAS.get(ALIAS.get(categoria, categoria))
+
+
+def diagnosticar(categoria: str, texto: str):
+    return obtener(categoria).evaluar(texto)
+
+
+def referencia(categoria: str, texto: str):
+    """Interpreta la tabla con `in`, regla por regla, como las cadenas originales."""
+    texto = texto.lower()
+    for regla in REGLAS[categoria]:
+        if any(all(t in texto for t in terminos) for terminos in _conjunciones(regla.si)):
+            return (regla.diagnostico, regla.nivel, regla.recomendacion)
+    return SIN_DIAGNOSTICO
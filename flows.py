@@ -0,0 +1,238 @@
+# flows.py
+import json
+import threading
+import time
+
+import metrics
+
+# ===================================================================
+# MÁQUINA DE ESTADOS DE CONVERSACIÓN (flujos de varios pasos)
+# ===================================================================
+# Cada flujo (med, stock, ruta, cita, orientacion) se declara como un
+# conjunto de pasos con su handler:
+#
+#     MED = FLUJOS.flujo("med")
+#
+#     @MED.estado("ask_name")
+#     def _med_ask_name(t, s):        # t: Turno, s: Sesion
+#         s.datos["name"] = t.text
+#         s.paso = "ask_freq"         # transición (s.terminar() cierra)
+#
+# despachar() busca (flujo, paso) en un dict: O(1) sin importar cuántos
+# pasos existan. La sesión es un registro compacto [flujo, paso, datos]
+# serializable a JSON, así puede vivir en memoria o en SQLite (varios
+# workers) y volcarse/cargarse para reproducir conversaciones en pruebas
+# y benchmarks. Un número puede tener a la vez una sesión por flujo.
+
+
+class Sesion:
+    """Registro de un flujo en curso: paso actual + datos recolectados."""
+
+    __slots__ = ("flujo", "paso", "datos")
+
+    def __init__(self, flujo: str, paso: str, datos: dict = None):
+        self.flujo = flujo
+        self.paso = paso
+        self.datos = datos if datos is not None else {}
+
+    def terminar(self):
+        """Marca el flujo como cerrado; el motor borra la sesión."""
+        self.paso = None
+
+    def registro(self) -> list:
+        return [self.flujo, self.paso, self.datos]
+
+    def a_json(self) -> str:
+        return json.dumps(self.registro(), ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def desde_registro(cls, registro):
+        flujo, paso, datos = registro
+        return cls(flujo, paso, dict(datos))
+
+    @classmethod
+    def desde_json(cls, texto: str):
+        return cls.desde_registro(json.loads(texto))
+
+    def __repr__(self):
+        return f"<Sesion {self.flujo}:{self.paso} {self.datos}>"
+
+
+# ---------- almacenes de sesiones ----------
+
+_SIN_SESIONES = {}
+
+
+class AlmacenMemoria:
+    """Sesiones en el proceso: { number: { flujo: Sesion } }."""
+
+    def __init__(self):
+        self._sesiones = {}
+
+    def leer(self, number) -> dict:
+        return self._sesiones.get(number, _SIN_SESIONES)
+
+    def guardar(self, number, sesion: Sesion):
+        self._sesiones.setdefault(number, {})[sesion.flujo] = sesion
+
+    def borrar(self, number, flujo):
+        sesiones = self._sesiones.get(number)
+        if sesiones:
+            sesiones.pop(flujo, None)
+            if not sesiones:
+                del self._sesiones[number]
+
+    def limpiar(self):
+        self._sesiones.clear()
+
+    def volcar(self) -> dict:
+        return {n: [s.registro() for s in ss.values()] for n, ss in self._sesiones.items()}
+
+
+class AlmacenSQLite:
+    """Sesiones en la tabla sesiones (compartidas entre workers)."""
+
+    def __init__(self, connect):
+        self.connect = connect
+        self._local = threading.local()
+        cx = self._conn()
+        with cx:
+            cx.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sesiones (
+                    number TEXT NOT NULL,
+                    flujo TEXT NOT NULL,
+                    registro TEXT NOT NULL,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (number, flujo)
+                )
+                """
+            )
+
+    def _conn(self):
+        cx = getattr(self._local, "cx", None)
+        if cx is None:
+            cx = self._local.cx = self.connect()
+            cx.execute("PRAGMA busy_timeout=5000")
+        return cx
+
+    @metrics.medido("db")
+    def leer(self, number) -> dict:
+        rows = self._conn().execute(
+            "SELECT flujo, registro FROM sesiones WHERE number=?", (number,)
+        ).fetchall()
+        return {flujo: Sesion.desde_json(registro) for flujo, registro in rows}
+
+    @metrics.medido("db")
+    def guardar(self, number, sesion: Sesion):
+        cx = self._conn()
+        with cx:
+            cx.execute(
+                "INSERT OR REPLACE INTO sesiones(number, flujo, registro, updated) VALUES(?,?,?,?)",
+                (number, sesion.flujo, sesion.a_json(), time.time()),
+            )
+
+    @metrics.medido("db")
+    def borrar(self, number, flujo):
+        cx = self._conn()
+        with cx:
+            cx.execute("DELETE FROM sesiones WHERE number=? AND flujo=?", (number, flujo))
+
+    def limpiar(self):
+        cx = self._conn()
+        with cx:
+            cx.execute("DELETE FROM sesiones")
+
+    def volcar(self) -> dict:
+        volcado = {}
+        for number, registro in self._conn().execute(
+            "SELECT number, registro FROM sesiones ORDER BY number, flujo"
+        ):
+            volcado.setdefault(number, []).append(json.loads(registro))
+        return volcado
+
+
+# ---------- motor ----------
+
+class Flujo:
+    """Pasos declarados de un flujo; los handlers se registran en el motor."""
+
+    def __init__(self, motor, nombre: str):
+        self.motor = motor
+        self.nombre = nombre
+
+    def estado(self, *pasos):
+        """Registra fn(t, s) como handler de uno o más pasos del flujo."""
+        def deco(fn):
+            for paso in pasos:
+                self.motor._tabla[(self.nombre, paso)] = fn
+            return fn
+        return deco
+
+    def __repr__(self):
+        return f"<Flujo {self.nombre}>"
+
+
+class MotorFlujos:
+    def __init__(self, almacen=None):
+        self.almacen = almacen if almacen is not None else AlmacenMemoria()
+        self.flujos = {}
+        self._tabla = {}          # { (flujo, paso): handler }
+
+    def flujo(self, nombre: str) -> Flujo:
+        if nombre not in self.flujos:
+            self.flujos[nombre] = Flujo(self, nombre)
+        return self.flujos[nombre]
+
+    # ---------- estado por número ----------
+    def iniciar(self, number, flujo: str, paso: str, **datos) -> Sesion:
+        """Abre (o reinicia) el flujo para number en el paso dado."""
+        sesion = Sesion(flujo, paso, datos)
+        self.almacen.guardar(number, sesion)
+        return sesion
+
+    def sesion(self, number, flujo: str):
+        """Sesión del flujo para number, o None."""
+        return self.almacen.leer(number).get(flujo)
+
+    def activo(self, number, flujo: str) -> bool:
+        return flujo in self.almacen.leer(number)
+
+    def guardar(self, number, sesion: Sesion):
+        """Persiste cambios hechos a una sesión fuera de despachar()."""
+        if sesion.paso is None:
+            self.almacen.borrar(number, sesion.flujo)
+        else:
+            self.almacen.guardar(number, sesion)
+
+    def terminar(self, number, flujo: str):
+        self.almacen.borrar(number, flujo)
+
+    # ---------- despacho ----------
+    def despachar(self, t, flujo: str) -> bool:
+        """
+        Ejecuta el handler del paso actual del flujo para t.number y guarda
+        la sesión resultante. False si no hay sesión o el paso no tiene
+        handler (la sesión queda intacta, sin respuesta).
+        """
+        sesion = self.sesion(t.number, flujo)
+        if sesion is None:
+            return False
+        handler = self._tabla.get((flujo, sesion.paso))
+        if handler is None:
+            return False
+        handler(t, sesion)
+        self.guardar(t.number, sesion)
+        return True
+
+    # ---------- volcado / carga (pruebas y benchmarks) ----------
+    def volcar(self) -> dict:
+        """{ number: [[flujo, paso, datos], ...] } apto para json.dumps."""
+        return self.almacen.volcar()
+
+    def cargar(self, volcado: dict):
+        """Reemplaza todas las sesiones por las de un volcado."""
+        self.almacen.limpiar()
+        for number, registros in volcado.items():
+            for registro in registros:
+                self.almacen.guardar(number, Sesion.desde_registro(registro))
@@ -0,0 +1,114 @@
+# fuzzy.py
+import re
+from functools import lru_cache
+
+# ===================================================================
+# SÍNTOMAS CON ERRORES DE TIPEO (índice de trigramas)
+# ===================================================================
+# "congestion nazal", "dolor de garganata" o "fievre" no contienen el
+# síntoma exacto. En vez de comparar cada síntoma contra cada trozo del
+# mensaje, se corrigen las PALABRAS del mensaje hacia el vocabulario de
+# palabras de los síntomas y después se usa la extracción exacta de
+# siempre sobre el texto corregido:
+#   1) al importar, cada palabra del vocabulario se indexa por sus
+#      trigramas de caracteres, agrupadas por largo;
+#   2) cada palabra del mensaje que no está en el vocabulario busca
+#      candidatas de largo compatible que compartan suficientes trigramas
+#      (filtro por conteo de q-gramas) y empiecen con la misma letra (el
+#      error de tipeo casi nunca está ahí; evita "color" → "dolor"), y las
+#      verifica con Levenshtein: similitud = 1 - distancia / largo mayor;
+#   3) solo se miran las primeras max_palabras palabras (re.sub con count),
+#      así el costo no depende del largo del mensaje, y las palabras ya
+#      vistas salen de una LRU.
+# Con umbral 0.8 una palabra de 4 letras o menos no admite errores
+# ("dos" nunca será "tos").
+
+_PALABRA = re.compile(r"\w+")
+
+
+def trigramas(texto: str) -> frozenset:
+    relleno = f"  {texto} "
+    return frozenset(relleno[i:i + 3] for i in range(len(relleno) - 2))
+
+
+def distancia(a: str, b: str) -> int:
+    """Distancia de Levenshtein (inserción, borrado, sustitución)."""
+    if len(a) < len(b):
+        a, b = b, a
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb)))
+        anterior = actual
+    return anterior[-1]
+
+
+def similitud(a: str, b: str) -> float:
+    largo = max(len(a), len(b))
+    return 1.0 - distancia(a, b) / largo if largo else 1.0
+
+
+class IndiceTrigramas:
+    """Palabras de un vocabulario indexadas por trigramas (búsqueda aproximada)."""
+
+    def __init__(self, terminos, cache: int = 4096):
+        self.palabras = list(dict.fromkeys(p for t in terminos for p in _PALABRA.findall(t)))
+        self._vocabulario = frozenset(self.palabras)
+        self._trigramas = [trigramas(p) for p in self.palabras]
+        self._indices = {}        # { largo: { trigrama: [id de palabra] } }
+        for i, palabra in enumerate(self.palabras):
+            indice = self._indices.setdefault(len(palabra), {})
+            for g in self._trigramas[i]:
+                indice.setdefault(g, []).append(i)
+        self._cercana = lru_cache(maxsize=cache)(self._buscar_cercana)
+
+    def _buscar_cercana(self, palabra: str, umbral: float):
+        tri = None
+        mejor, mejor_s = None, umbral
+        for largo in range(int(len(palabra) * umbral), int(len(palabra) / umbral) + 1):
+            indice = self._indices.get(largo)
+            if indice is None:
+                continue
+            # con umbral u caben a lo sumo (1 - u) * largo errores
+            errores = int((1.0 - umbral) * max(len(palabra), largo) + 1e-9)
+            if errores == 0 or abs(len(palabra) - largo) > errores:
+                continue
+            if tri is None:
+                tri = trigramas(palabra)
+            comunes = {}
+            for g in tri:
+                for i in indice.get(g, ()):
+                    comunes[i] = comunes.get(i, 0) + 1
+            for i, n in comunes.items():
+                # cada error cambia a lo sumo 3 trigramas
+                if (n < max(len(tri), len(self._trigramas[i])) - 3 * errores
+                        or self.palabras[i][0] != palabra[0]):
+                    continue
+                s = similitud(palabra, self.palabras[i])
+                if s > mejor_s or (s == mejor_s and mejor is None):
+                    mejor, mejor_s = self.palabras[i], s
+        return mejor
+
+    def cercana(self, palabra: str, umbral: float):
+        """Palabra del vocabulario más parecida (>= umbral), o None si ya es exacta o no hay."""
+        if palabra in self._vocabulario or umbral >= 1.0:
+            return None
+        return self._cercana(palabra, umbral)
+
+    def corregir(self, texto: str, umbral: float, max_palabras: int):
+        """
+        (texto con las palabras corregidas, [(escrita, corregida)]); solo las
+        primeras max_palabras palabras se revisan.
+        """
+        cambios = []
+
+        def reemplazo(m):
+            corregida = self.cercana(m.group(), umbral)
+            if corregida is None:
+                return m.group()
+            cambios.append((m.group(), corregida))
+            return corregida
+
+        corregido = _PALABRA.sub(reemplazo, texto, count=max_palabras)
+        return corregido, cambios
@@ -0,0 +1,92 @@
+# intents.py
+from collections import deque, namedtuple
+
+# ===================================================================
+# AUTÓMATA AHO-CORASICK (varias palabras clave en una sola pasada)
+# ===================================================================
+# Se construye una vez al importar con todas las palabras clave y una
+# etiqueta por palabra (la intención, el síntoma, la prioridad de la
+# ruta...). buscar() recorre el texto UNA vez y devuelve cada coincidencia
+# con su posición, sin importar cuántas palabras haya; con `in` el costo
+# crece con la cantidad de palabras × largo del texto.
+#
+# Las transiciones se precalculan completas (autómata determinista): por
+# cada carácter hay un solo lookup en un dict, sin seguir enlaces de falla
+# en tiempo de búsqueda.
+
+Coincidencia = namedtuple("Coincidencia", "inicio fin palabra etiqueta")
+
+
+class Automata:
+    """Aho-Corasick sobre pares (palabra, etiqueta)."""
+
+    def __init__(self, pares):
+        goto = [{}]
+        salidas = [[]]
+        for palabra, etiqueta in pares:
+            if not palabra:
+                continue
+            nodo = 0
+            for ch in palabra:
+                sig = goto[nodo].get(ch)
+                if sig is None:
+                    sig = len(goto)
+                    goto[nodo][ch] = sig
+                    goto.append({})
+                    salidas.append([])
+                nodo = sig
+            salidas[nodo].append((palabra, etiqueta))
+
+        # Enlaces de falla por BFS; cada nodo hereda las salidas de su falla
+        # y las transiciones que le faltan (así queda determinista).
+        falla = [0] * len(goto)
+        delta = [dict(g) for g in goto]
+        cola = deque(goto[0].values())
+        while cola:
+            nodo = cola.popleft()
+            for ch, sig in goto[nodo].items():
+                cola.append(sig)
+                f = falla[nodo]
+                while f and ch not in goto[f]:
+                    f = falla[f]
+                cand = goto[f].get(ch, 0)
+                falla[sig] = cand if cand != sig else 0
+                salidas[sig] = salidas[sig] + salidas[falla[sig]]
+            for ch, sig in delta[falla[nodo]].items():
+                delta[nodo].setdefault(ch, sig)
+        self._delta = delta
+        self._salidas = [tuple(s) for s in salidas]
+        self._finales = frozenset(i for i, s in enumerate(salidas) if s)
+        self._palabras = [frozenset(p for p, _ in s) for s in salidas]
+        self.estados = len(goto)
+
+    def buscar(self, texto: str) -> list:
+        """Todas las coincidencias (pueden solaparse), en orden de término."""
+        delta, finales, salidas = self._delta, self._finales, self._salidas
+        encontrados = []
+        nodo = 0
+        for i, ch in enumerate(texto):
+            nodo = delta[nodo].get(ch, 0)
+            if nodo in finales:
+                fin = i + 1
+                for palabra, etiqueta in salidas[nodo]:
+                    encontrados.append(Coincidencia(fin - len(palabra), fin, palabra, etiqueta))
+        return encontrados
+
+    def etiquetas(self, texto: str) -> set:
+        """Solo el conjunto de etiquetas presentes en el texto."""
+        return {c.etiqueta for c in self.buscar(texto)}
+
+    def palabras(self, texto: str) -> set:
+        """Solo el conjunto de palabras presentes (sin posiciones ni Coincidencias)."""
+        delta, finales = self._delta, self._finales
+        vistos = set()
+        nodo = 0
+        for ch in texto:
+            nodo = delta[nodo].get(ch, 0)
+            if nodo in finales:
+                vistos.add(nodo)
+        presentes = set()
+        for nodo in vistos:
+            presentes |= self._palabras[nodo]
+        return presentes
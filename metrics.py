@@ -0,0 +1,193 @@
+# metrics.py
+import threading
+import bisect
+import time
+from functools import wraps
+
+import sett
+
+# ===================================================================
+# MÉTRICAS EN PROCESO (contadores, gauges e histogramas)
+# ===================================================================
+# Todo vive en memoria del proceso; se exporta vía GET /metrics (app.py).
+
+# Límites superiores de los buckets en milisegundos
+BUCKETS_MS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100,
+    250, 500, 1000, 2500, 5000, 10000, 30000
+)
+
+_LOCK = threading.Lock()
+_COUNTERS = {}   # { nombre: int }
+_GAUGES = {}     # { nombre: float }
+_HISTOS = {}     # { nombre: Histograma }
+
+
+class Histograma:
+    """Histograma de buckets fijos; los percentiles se estiman por bucket."""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        target = self.count * p
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return min(BUCKETS_MS[i], self.max) if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "max_ms": round(self.max, 3),
+        }
+
+
+def incr(name: str, n: int = 1):
+    with _LOCK:
+        _COUNTERS[name] = _COUNTERS.get(name, 0) + n
+
+
+def gauge(name: str, value: float):
+    with _LOCK:
+        _GAUGES[name] = value
+
+
+def gauge_max(name: str, value: float):
+    """Guarda el máximo observado (p.ej. profundidad máxima de cola)."""
+    with _LOCK:
+        if value > _GAUGES.get(name, float("-inf")):
+            _GAUGES[name] = value
+
+
+def observe(name: str, value_ms: float):
+    with _LOCK:
+        h = _HISTOS.get(name)
+        if h is None:
+            h = _HISTOS[name] = Histograma()
+        h.observe(value_ms)
+
+
+def snapshot() -> dict:
+    with _LOCK:
+        return {
+            "counters": dict(_COUNTERS),
+            "gauges": dict(_GAUGES),
+            "histograms": {k: h.snapshot() for k, h in _HISTOS.items()},
+        }
+
+
+def reset():
+    """Limpia todas las métricas (útil en benchmarks)."""
+    with _LOCK:
+        _COUNTERS.clear()
+        _GAUGES.clear()
+        _HISTOS.clear()
+        _TURNOS.clear()
+
+
+# ===================================================================
+# PERFIL POR MENSAJE (ruta + tramos del camino caliente)
+# ===================================================================
+# administrar_chatbot abre un Perfil por mensaje; las funciones marcadas
+# con @medido("db") / @medido("send") suman su tiempo al perfil del hilo.
+# Al cerrar se agrega por ruta: histogramas route/build/db/send/total y
+# payloads emitidos (GET /metrics/rutas). Con TURN_METRICS=0 medido()
+# devuelve la función tal cual y no se abre ningún perfil.
+
+TRAMOS = ("route", "build", "db", "send", "total")
+
+_PERFIL = threading.local()
+_TURNOS = {}     # { ruta: _Turnos }
+
+
+class _Turnos:
+    __slots__ = ("histos", "payloads")
+
+    def __init__(self):
+        self.histos = {tramo: Histograma() for tramo in TRAMOS}
+        self.payloads = 0
+
+
+class Perfil:
+    """Tiempos (ms) de un mensaje por tramo; activo en el hilo dentro del with."""
+
+    __slots__ = ("db", "send", "_tramo")
+
+    def __init__(self):
+        self.db = 0.0
+        self.send = 0.0
+        self._tramo = None
+
+    def __enter__(self):
+        _PERFIL.actual = self
+        return self
+
+    def __exit__(self, *exc):
+        _PERFIL.actual = None
+        return False
+
+
+def medido(tramo: str):
+    """Decorador: suma la duración de la llamada al tramo del perfil activo."""
+    def deco(fn):
+        if not sett.TURN_METRICS:
+            return fn
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            p = getattr(_PERFIL, "actual", None)
+            if p is None or p._tramo is not None:
+                return fn(*args, **kwargs)   # sin perfil o ya dentro de otro tramo
+            p._tramo = tramo
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                setattr(p, tramo, getattr(p, tramo) + (time.perf_counter() - t0) * 1000)
+                p._tramo = None
+        return wrapper
+    return deco
+
+
+def observe_turno(ruta: str, tiempos: dict, payloads: int):
+    """Agrega un mensaje atendido: tiempos = { tramo: ms } (ver TRAMOS)."""
+    with _LOCK:
+        agg = _TURNOS.get(ruta)
+        if agg is None:
+            agg = _TURNOS[ruta] = _Turnos()
+        for tramo, ms in tiempos.items():
+            agg.histos[tramo].observe(ms)
+        agg.payloads += payloads
+
+
+def snapshot_turnos() -> dict:
+    """{ ruta: {count, payloads, route|build|db|send|total: {p50_ms...}} }."""
+    with _LOCK:
+        data = {}
+        for ruta, agg in sorted(_TURNOS.items()):
+            fila = {"count": agg.histos["total"].count, "payloads": agg.payloads}
+            for tramo, h in agg.histos.items():
+                fila[tramo] = h.snapshot()
+            data[ruta] = fila
+        return data
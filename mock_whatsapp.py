@@ -0,0 +1,370 @@
+# mock_whatsapp.py
+"""
+Servidor local que imita el endpoint /messages de la WhatsApp Cloud API
+para pruebas de carga y latencia sin red. Solo usa la biblioteca estándar.
+
+Uso:
+    python mock_whatsapp.py --port 8799 --latency lognormal:40,0.5 \\
+        --error-rate 0.01 --burst-429 30:2
+    WHATSAPP_URL=http://127.0.0.1:8799/v17.0/PHONE_ID/messages python app.py
+
+Endpoints:
+    POST /<cualquier ruta>   valida el payload y responde como la Graph API
+    GET  /stats              throughput, estados, tipos y últimos rechazos
+    POST /reset              reinicia las estadísticas
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ===================================================================
+# LÍMITES DE LA API (los que usan nuestros builders)
+# ===================================================================
+MAX_TEXT_BODY = 4096
+MAX_INTERACTIVE_BODY = 1024
+MAX_FOOTER = 60
+MAX_BUTTONS = 3
+MAX_BUTTON_TITLE = 20
+MAX_BUTTON_ID = 256
+MAX_LIST_BUTTON = 20
+MAX_LIST_ROWS = 10
+MAX_SECTIONS = 10
+MAX_SECTION_TITLE = 24
+MAX_ROW_TITLE = 24
+MAX_ROW_DESCRIPTION = 72
+MAX_ROW_ID = 200
+
+
+def _check_len(errores, campo, valor, maximo, minimo=1):
+    if not isinstance(valor, str):
+        errores.append(f"{campo}: debe ser texto")
+    elif not minimo <= len(valor) <= maximo:
+        errores.append(f"{campo}: largo {len(valor)} fuera de [{minimo}, {maximo}]")
+
+
+def _validar_button(errores, inter):
+    buttons = inter.get("action", {}).get("buttons") or []
+    if not 1 <= len(buttons) <= MAX_BUTTONS:
+        errores.append(f"action.buttons: {len(buttons)} botones (máx {MAX_BUTTONS})")
+    ids = set()
+    for i, b in enumerate(buttons):
+        reply = b.get("reply", {})
+        if b.get("type") != "reply":
+            errores.append(f"action.buttons[{i}].type debe ser 'reply'")
+        _check_len(errores, f"action.buttons[{i}].title", reply.get("title"), MAX_BUTTON_TITLE)
+        _check_len(errores, f"action.buttons[{i}].id", reply.get("id"), MAX_BUTTON_ID)
+        if reply.get("id") in ids:
+            errores.append(f"action.buttons[{i}].id duplicado")
+        ids.add(reply.get("id"))
+
+
+def _validar_list(errores, inter):
+    action = inter.get("action", {})
+    _check_len(errores, "action.button", action.get("button"), MAX_LIST_BUTTON)
+    sections = action.get("sections") or []
+    if not 1 <= len(sections) <= MAX_SECTIONS:
+        errores.append(f"action.sections: {len(sections)} secciones (máx {MAX_SECTIONS})")
+    total, ids = 0, set()
+    for s, sec in enumerate(sections):
+        if len(sections) > 1 or "title" in sec:
+            _check_len(errores, f"sections[{s}].title", sec.get("title"), MAX_SECTION_TITLE)
+        for r, row in enumerate(sec.get("rows") or []):
+            total += 1
+            _check_len(errores, f"sections[{s}].rows[{r}].title", row.get("title"), MAX_ROW_TITLE)
+            _check_len(errores, f"sections[{s}].rows[{r}].id", row.get("id"), MAX_ROW_ID)
+            if "description" in row:
+                _check_len(errores, f"sections[{s}].rows[{r}].description",
+                           row["description"], MAX_ROW_DESCRIPTION, minimo=0)
+            if row.get("id") in ids:
+                errores.append(f"sections[{s}].rows[{r}].id duplicado")
+            ids.add(row.get("id"))
+    if not 1 <= total <= MAX_LIST_ROWS:
+        errores.append(f"action.sections: {total} filas en total (máx {MAX_LIST_ROWS})")
+
+
+def validar(payload: dict) -> tuple:
+    """Devuelve (tipo, [errores]) para un payload de /messages."""
+    errores = []
+    if payload.get("messaging_product") != "whatsapp":
+        errores.append("messaging_product debe ser 'whatsapp'")
+
+    # markRead_Message
+    if "status" in payload:
+        if payload.get("status") != "read":
+            errores.append("status solo admite 'read'")
+        if not payload.get("message_id"):
+            errores.append("message_id requerido")
+        return "read", errores
+
+    tipo = payload.get("type")
+    if not payload.get("to"):
+        errores.append("to requerido")
+
+    if tipo == "text":
+        _check_len(errores, "text.body", payload.get("text", {}).get("body"), MAX_TEXT_BODY)
+    elif tipo == "reaction":
+        reaction = payload.get("reaction", {})
+        if not reaction.get("message_id"):
+            errores.append("reaction.message_id requerido")
+        if not isinstance(reaction.get("emoji"), str):
+            errores.append("reaction.emoji requerido")
+    elif tipo == "interactive":
+        inter = payload.get("interactive", {})
+        tipo = f"interactive.{inter.get('type')}"
+        _check_len(errores, "interactive.body.text",
+                   inter.get("body", {}).get("text"), MAX_INTERACTIVE_BODY)
+        if "footer" in inter:
+            _check_len(errores, "interactive.footer.text",
+                       inter["footer"].get("text"), MAX_FOOTER)
+        if inter.get("type") == "button":
+            _validar_button(errores, inter)
+        elif inter.get("type") == "list":
+            _validar_list(errores, inter)
+        else:
+            errores.append(f"interactive.type no soportado: {inter.get('type')}")
+    else:
+        errores.append(f"type no soportado: {tipo}")
+    return tipo, errores
+
+
+# ===================================================================
+# FALLAS INYECTADAS
+# ===================================================================
+class Latency:
+    """
+    Distribución de latencia en ms:
+      fixed:50 | uniform:20-80 | exp:40 | lognormal:MEDIANA,SIGMA
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, _, args = spec.partition(":")
+        self.spec = spec
+        if kind == "fixed":
+            v = float(args or 0)
+            self._sample = lambda: v
+        elif kind == "uniform":
+            lo, _, hi = args.partition("-")
+            lo, hi = float(lo), float(hi or lo)
+            self._sample = lambda: random.uniform(lo, hi)
+        elif kind == "exp":
+            mean = float(args)
+            self._sample = lambda: random.expovariate(1 / mean) if mean > 0 else 0.0
+        elif kind == "lognormal":
+            median, _, sigma = args.partition(",")
+            mu, sigma = math.log(float(median)), float(sigma or 0.5)
+            self._sample = lambda: random.lognormvariate(mu, sigma)
+        else:
+            raise ValueError(f"latencia desconocida: {spec}")
+
+    def sample_s(self) -> float:
+        return max(0.0, self._sample()) / 1000
+
+
+class Bursts:
+    """Ráfagas de 429: DURACION segundos de cada PERIODO ('30:2')."""
+
+    def __init__(self, spec: str = None, retry_after: float = 1.0):
+        self.period, self.duration = (0.0, 0.0)
+        if spec:
+            p, _, d = spec.partition(":")
+            self.period, self.duration = float(p), float(d)
+        self.retry_after = retry_after
+        self.t0 = time.monotonic()
+
+    def active(self) -> bool:
+        if self.period <= 0 or self.duration <= 0:
+            return False
+        return (time.monotonic() - self.t0) % self.period < self.duration
+
+
+# ===================================================================
+# ESTADÍSTICAS
+# ===================================================================
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.t0 = time.monotonic()
+            self.total = 0
+            self.status = Counter()
+            self.tipos = Counter()
+            self.recent = deque()                 # instantes de respuestas 200
+            self.rejected = deque(maxlen=20)      # últimos payloads inválidos
+            self.latency_ms = deque(maxlen=10000)
+            self.in_flight = 0
+            self.max_in_flight = 0
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def end(self, status: int, tipo: str, latency_s: float, errores=None, payload=None):
+        now = time.monotonic()
+        with self.lock:
+            self.in_flight -= 1
+            self.total += 1
+            self.status[status] += 1
+            self.tipos[tipo or "?"] += 1
+            self.latency_ms.append(latency_s * 1000)
+            if status == 200:
+                self.recent.append(now)
+            if errores:
+                self.rejected.append({"type": tipo, "errors": errores, "payload": payload})
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self.lock:
+            while self.recent and now - self.recent[0] > 10:
+                self.recent.popleft()
+            elapsed = max(1e-9, now - self.t0)
+            lat = sorted(self.latency_ms)
+            pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))], 3) if lat else 0
+            return {
+                "elapsed_s": round(elapsed, 3),
+                "total": self.total,
+                "ok_per_sec": round(self.status[200] / elapsed, 2),
+                "ok_per_sec_10s": round(len(self.recent) / min(10.0, elapsed), 2),
+                "status": dict(self.status),
+                "types": dict(self.tipos),
+                "max_in_flight": self.max_in_flight,
+                "latency_ms": {"p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99)},
+                "last_rejected": list(self.rejected),
+            }
+
+
+# ===================================================================
+# SERVIDOR
+# ===================================================================
+class MockWhatsApp(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, latency: Latency, error_rate: float, bursts: Bursts, token: str = None):
+        super().__init__(addr, _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.bursts = bursts
+        self.token = token
+        self.stats = Stats()
+        self.ids = itertools.count(1)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"     # keep-alive, como la Graph API
+    # Cabeceras y cuerpo en un solo segmento (sin esperas de Nagle/ACK diferido)
+    wbufsize = 1 << 16
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: dict, headers=None):
+        raw = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    @staticmethod
+    def _error(message: str, code: int, kind: str = "OAuthException") -> dict:
+        return {"error": {"message": message, "type": kind, "code": code}}
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._reply(200, self.server.stats.snapshot())
+        else:
+            self._reply(404, self._error("Unknown path", 404))
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        srv = self.server
+        if self.path.rstrip("/") == "/reset":
+            srv.stats.reset()
+            self._reply(200, {"success": True})
+            return
+
+        t0 = time.perf_counter()
+        srv.stats.begin()
+        tipo, errores, status = None, None, 200
+        try:
+            time.sleep(srv.latency.sample_s())
+            auth = self.headers.get("Authorization", "")
+            if not auth.startswith("Bearer ") or (srv.token and auth != f"Bearer {srv.token}"):
+                status, body = 401, self._error("Invalid OAuth access token", 190)
+            elif srv.bursts.active():
+                status, body = 429, self._error("Too many messages sent from this phone number", 131056)
+                self._reply(status, body, {"Retry-After": f"{srv.bursts.retry_after:g}"})
+                return
+            elif random.random() < srv.error_rate:
+                status, body = 500, self._error("Service temporarily unavailable", 131000, "GraphMethodException")
+            else:
+                try:
+                    payload = json.loads(raw)
+                except ValueError:
+                    payload, tipo, errores = None, "invalid_json", ["JSON inválido"]
+                else:
+                    tipo, errores = validar(payload)
+                if errores:
+                    status = 400
+                    body = self._error("(#100) Invalid parameter: " + "; ".join(errores), 100)
+                elif tipo == "read":
+                    body = {"success": True}
+                else:
+                    to = payload["to"]
+                    body = {
+                        "messaging_product": "whatsapp",
+                        "contacts": [{"input": to, "wa_id": to}],
+                        "messages": [{"id": f"wamid.MOCK{next(srv.ids):012d}"}],
+                    }
+            self._reply(status, body)
+        finally:
+            srv.stats.end(status, tipo, time.perf_counter() - t0, errores,
+                          raw[:500].decode("utf-8", "replace") if errores else None)
+
+
+def run(host: str = "127.0.0.1", port: int = 8799, latency: str = "fixed:0",
+        error_rate: float = 0.0, burst_429: str = None, retry_after: float = 1.0,
+        token: str = None, background: bool = False) -> MockWhatsApp:
+    """Levanta el servidor. Con background=True corre en un hilo y lo devuelve."""
+    srv = MockWhatsApp((host, port), Latency(latency), error_rate,
+                       Bursts(burst_429, retry_after), token)
+    if background:
+        threading.Thread(target=srv.serve_forever, name="mock-whatsapp", daemon=True).start()
+    return srv
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock local de la WhatsApp Cloud API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--latency", default="fixed:0",
+                        help="fixed:MS | uniform:MIN-MAX | exp:MEDIA | lognormal:MEDIANA,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de 500 aleatorios")
+    parser.add_argument("--burst-429", default=None, help="PERIODO:DURACION en segundos (p.ej. 30:2)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After de los 429")
+    parser.add_argument("--token", default=None, help="exige este Bearer token")
+    args = parser.parse_args()
+
+    srv = run(args.host, args.port, args.latency, args.error_rate,
+              args.burst_429, args.retry_after, args.token)
+    print(f"🧪 Mock WhatsApp en http://{args.host}:{args.port}/ (stats en /stats)")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+# outbound.py
+import heapq
+import itertools
+import queue
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import sett
+import metrics
+import transport
+
+# ===================================================================
+# COLA DE SALIDA: ENVÍO ASÍNCRONO CON REINTENTOS Y DEAD-LETTER
+# ===================================================================
+# Las respuestas y recordatorios se encolan y N hilos emisores los envían.
+# Cada destinatario cae siempre en el mismo emisor (hash del número), así
+# se respeta el orden por usuario aunque haya reintentos. Se reintenta con
+# backoff exponencial + jitter ante 429, 5xx y errores de red, respetando
+# Retry-After; el resto de errores (4xx) van directo a dead-letter.
+#
+# Con el circuit breaker abierto el envío no se intenta: el payload queda
+# "estacionado" (on_done(None)) y el outbox lo reintenta cuando el circuito
+# vuelva a probar; sin on_done va a dead-letter.
+#
+# Entrega diferida: un payload puede llevar "no enviar antes de" (not_before).
+# Un hilo temporizador lo mantiene en un heap y lo libera a su emisor al
+# vencer, de modo que el espaciado entre mensajes no bloquea ningún hilo.
+#
+# Los reintentos usan el mismo heap: el emisor no duerme el backoff (cada
+# emisor atiende a muchos números y uno con 429 frenaría a los demás). El
+# payload vuelve al heap con su vencimiento y, mientras tanto, el emisor
+# retiene en orden lo que llegue para ese número; al terminar el reintento
+# (enviado o descartado) los envía detrás de él.
+
+
+# intento de un acuse (reacción): un solo envío, sin reintentos ni dead-letter
+_UN_INTENTO = -1
+
+
+def _is_retryable(status: int) -> bool:
+    return status == 0 or status == 429 or status >= 500
+
+
+class OutboundQueue:
+    """Emisores seriales por destinatario con reintentos y dead-letter."""
+
+    def __init__(self, senders: int, max_retries: int, backoff_base: float,
+                 backoff_max: float, dead_letter_size: int):
+        self.senders = max(1, senders)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queues = [queue.Queue() for _ in range(self.senders)]
+        self.dead_letters = deque(maxlen=max(1, dead_letter_size))
+        self._lock = threading.Lock()
+        self._started = False
+        self._timer_cv = threading.Condition()
+        self._heap = []                    # [(not_before, seq, number, data, on_done, intento)]
+        self._seq = itertools.count()
+        self._last_due = {}                # { number: último not_before programado }
+        # por emisor (solo lo toca su hilo): { number: deque[(data, on_done, intento)] }
+        # detrás de un reintento pendiente
+        self._retenidos = [{} for _ in range(self.senders)]
+
+    def start(self):
+        """Arranca los hilos emisores (idempotente)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for i in range(self.senders):
+                threading.Thread(
+                    target=self._run, args=(i,), name=f"outbound-{i}", daemon=True
+                ).start()
+            threading.Thread(target=self._timer, name="outbound-timer", daemon=True).start()
+        metrics.gauge("outbound.senders", self.senders)
+        print(f"📤 Cola de salida iniciada ({self.senders} emisores).")
+
+    def enqueue(self, number: str, data, on_done=None, not_before: float = None,
+                una_vez: bool = False):
+        """
+        Encola un payload para number. on_done(ok) se llama al terminar
+        (ok=None: circuito abierto, no se intentó).
+        not_before (time.monotonic()) difiere la entrega sin bloquear; para un
+        mismo número nunca se adelanta a un payload programado antes.
+        una_vez: acuse; cualquier error es final (sin reintento ni dead-letter),
+        así nunca retiene las respuestas que vienen detrás.
+        """
+        metrics.incr("outbound.enqueued")
+        attempt = _UN_INTENTO if una_vez else 0
+        with self._timer_cv:
+            last = self._last_due.get(number)
+            if not_before is None and last is None:
+                self._release(number, data, on_done, attempt)
+                return
+            now = time.monotonic()
+            due = max(not_before or now, last or now)
+            self._last_due[number] = due
+            heapq.heappush(self._heap, (due, next(self._seq), number, data, on_done, attempt))
+            metrics.gauge("outbound.delayed", len(self._heap))
+            self._timer_cv.notify()
+
+    def _schedule_retry(self, number, data, on_done, attempt: int, delay: float):
+        """Devuelve el payload al heap; el emisor queda libre durante el backoff."""
+        with self._timer_cv:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq),
+                                        number, data, on_done, attempt))
+            metrics.gauge("outbound.delayed", len(self._heap))
+            self._timer_cv.notify()
+
+    def _release(self, number, data, on_done, attempt=0):
+        q = self.queues[zlib.crc32((number or "").encode("utf-8")) % self.senders]
+        q.put((time.perf_counter(), number, data, on_done, attempt))
+        metrics.gauge_max("outbound.depth_max", q.qsize())
+
+    def _timer(self):
+        """Libera a su emisor los payloads diferidos cuyo not_before venció."""
+        with self._timer_cv:
+            while True:
+                if not self._heap:
+                    self._timer_cv.wait()
+                    continue
+                due = self._heap[0][0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self._timer_cv.wait(wait)
+                    continue
+                due, _, number, data, on_done, attempt = heapq.heappop(self._heap)
+                if attempt <= 0 and self._last_due.get(number) == due:
+                    # Nada más programado para este número después de este
+                    del self._last_due[number]
+                self._release(number, data, on_done, attempt)
+                metrics.gauge("outbound.delayed", len(self._heap))
+
+    def _backoff(self, attempt: int, retry_after) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay = random.uniform(delay / 2, delay)   # jitter
+        if retry_after is not None:
+            # Retry-After es un piso: reintentar antes solo gana otro 429;
+            # backoff_max topa el exponencial, no lo que pide el servidor
+            delay = max(delay, retry_after)
+        return delay
+
+    def _dead_letter(self, number, data, status, error, attempts):
+        self.dead_letters.append({
+            "number": number,
+            "data": data,
+            "status": status,
+            "error": error[:500],
+            "attempts": attempts,
+            "at": time.time(),
+        })
+        metrics.incr("outbound.dead_letters")
+
+    def _deliver(self, number, data, on_done, attempt: int) -> bool:
+        """
+        Un intento de envío. False si quedó un reintento programado; True si
+        terminó (enviado, descartado o estacionado con el circuito abierto).
+        """
+        ok = False
+        try:
+            resp = transport.post(data)
+            if resp.status == 200:
+                ok = True
+            elif resp.status == transport.CIRCUIT_OPEN:
+                ok = None
+            elif attempt == _UN_INTENTO:
+                print(f"⚠️ [outbound] acuse a {number} no enviado ({resp.status}): {resp.text[:200]}")
+            elif _is_retryable(resp.status) and attempt < self.max_retries:
+                delay = self._backoff(attempt, resp.retry_after)
+                metrics.incr("outbound.retries")
+                if resp.status == 429:
+                    metrics.incr("outbound.throttled")
+                print(f"⚠️ [outbound] {resp.status} enviando a {number}, "
+                      f"reintento {attempt + 1} en {delay:.2f}s")
+                self._schedule_retry(number, data, on_done, attempt + 1, delay)
+                return False
+            else:
+                print(f"❌ [outbound] envío a {number} descartado ({resp.status}): {resp.text[:200]}")
+                self._dead_letter(number, data, resp.status, resp.text, attempt + 1)
+            if ok is None:
+                metrics.incr("outbound.parked")
+                if on_done is None:
+                    self._dead_letter(number, data, transport.CIRCUIT_OPEN, "circuit open", 0)
+            else:
+                metrics.incr("outbound.sent" if ok else "outbound.failed")
+        except Exception as e:
+            metrics.incr("outbound.failed")
+            print(f"❌ [outbound] excepción enviando a {number}: {e}")
+        if on_done is not None:
+            try:
+                on_done(ok)
+            except Exception as e:
+                print(f"❌ [outbound] error en callback: {e}")
+        return True
+
+    def _run(self, i):
+        q = self.queues[i]
+        retenidos = self._retenidos[i]
+        while True:
+            enqueued_at, number, data, on_done, attempt = q.get()
+            try:
+                if attempt <= 0:
+                    metrics.observe("outbound.queue_wait_ms", (time.perf_counter() - enqueued_at) * 1000)
+                    if number in retenidos:
+                        # hay un reintento pendiente: no puede adelantársele
+                        retenidos[number].append((data, on_done, attempt))
+                        continue
+                if not self._deliver(number, data, on_done, attempt):
+                    retenidos.setdefault(number, deque())
+                    continue
+                # terminado: salen los retenidos en orden hasta otro reintento
+                pendientes = retenidos.pop(number, None)
+                while pendientes:
+                    data, on_done, attempt = pendientes.popleft()
+                    if not self._deliver(number, data, on_done, attempt):
+                        retenidos[number] = pendientes
+                        break
+            finally:
+                q.task_done()
+
+    def join(self):
+        """Espera a que se vacíen el heap diferido, las colas y los retenidos (benchmarks / apagado)."""
+        while True:
+            with self._timer_cv:
+                pending = len(self._heap)
+            if not pending:
+                for q in self.queues:
+                    q.join()
+                with self._timer_cv:
+                    # un reintento pudo volver al heap mientras se vaciaban las colas
+                    if not self._heap and not any(self._retenidos):
+                        break
+            time.sleep(0.01)
+
+    def stats(self) -> dict:
+        return {
+            "senders": self.senders,
+            "depth": [q.qsize() for q in self.queues],
+            "delayed": len(self._heap),
+            "held": sum(len(d) for r in self._retenidos for d in list(r.values())),
+            "dead_letters": len(self.dead_letters),
+            "last_dead_letters": [
+                {k: v for k, v in d.items() if k != "data"}
+                for d in list(self.dead_letters)[-5:]
+            ],
+        }
+
+
+# ===================================================================
+# ACUSES (markRead / reacción inicial): fire-and-forget
+# ===================================================================
+# markRead se envía en un pool aparte, en paralelo con el cálculo de la
+# respuesta y sin pasar por los emisores ordenados; un fallo solo se
+# registra y no afecta a la respuesta principal (sin reintentos ni
+# dead-letter).
+#
+# La reacción inicial NO puede ir por ese pool: WhatsApp conserva solo la
+# última reacción del negocio sobre un mensaje, y una 🩺 que llega tarde
+# pisaría la 🚨 o la ❓ que la ruta envía por la cola ordenada. Por eso
+# send_reaction() la encola en el emisor del destinatario, delante de las
+# respuestas del turno, con un solo intento: un 429/5xx o el circuito
+# abierto la descartan sin reintento ni dead-letter, así un acuse fallido
+# nunca retiene la respuesta.
+
+_ACK_POOL = None
+_ACK_LOCK = threading.Lock()
+
+
+def _ack_pool() -> ThreadPoolExecutor:
+    global _ACK_POOL
+    with _ACK_LOCK:
+        if _ACK_POOL is None:
+            _ACK_POOL = ThreadPoolExecutor(
+                max_workers=max(1, sett.ACK_SENDERS), thread_name_prefix="ack"
+            )
+        return _ACK_POOL
+
+
+def _send_ack(data):
+    try:
+        resp = transport.post(data)
+        metrics.observe("ack.post_ms", resp.elapsed_ms)
+        if resp.status == 200:
+            metrics.incr("ack.sent")
+        elif resp.status == transport.CIRCUIT_OPEN:
+            metrics.incr("ack.dropped")     # acuse sin valor tardío: se descarta
+        else:
+            metrics.incr("ack.failed")
+            print(f"⚠️ [ack] acuse no enviado ({resp.status}): {resp.text[:200]}")
+    except Exception as e:
+        metrics.incr("ack.failed")
+        print(f"⚠️ [ack] excepción enviando acuse: {e}")
+
+
+def send_ack(data):
+    """Dispara un acuse sin esperar su resultado."""
+    metrics.incr("ack.enqueued")
+    _ack_pool().submit(_send_ack, data)
+
+
+def _reaction_done(ok):
+    # ok=None: circuito abierto; una reacción tardía no vale, no se estaciona
+    metrics.incr("ack.sent" if ok else "ack.dropped" if ok is None else "ack.failed")
+
+
+def send_reaction(number, data):
+    """Encola una reacción en el emisor de number, antes de lo que se encole después."""
+    metrics.incr("ack.enqueued")
+    get_outbound().enqueue(number, data, on_done=_reaction_done, una_vez=True)
+
+
+class LatencyPolicy:
+    """
+    Latencia "humanizada" mínima percibida por flujo. En vez de dormir el
+    hilo, la demora se aplica como not_before del primer mensaje: si el
+    procesamiento ya tardó más, no se agrega espera.
+    """
+
+    def __init__(self, enabled: bool, default_range, per_flow: dict):
+        self.enabled = enabled
+        self.default_range = default_range
+        self.per_flow = per_flow
+
+    @staticmethod
+    def parse_range(txt: str):
+        """'0.5-1.5' → (0.5, 1.5); '0' → (0.0, 0.0)."""
+        lo, _, hi = txt.strip().partition("-")
+        lo = float(lo)
+        hi = float(hi) if hi else lo
+        return (min(lo, hi), max(lo, hi))
+
+    @classmethod
+    def from_config(cls, enabled: bool, default_txt: str, flows_txt: str):
+        per_flow = {}
+        for item in filter(None, (x.strip() for x in flows_txt.split(","))):
+            flow, _, rng = item.partition(":")
+            per_flow[flow.strip()] = cls.parse_range(rng or "0")
+        return cls(enabled, cls.parse_range(default_txt), per_flow)
+
+    def delay(self, flow: str = None) -> float:
+        if not self.enabled:
+            return 0.0
+        lo, hi = self.per_flow.get(flow, self.default_range)
+        return random.uniform(lo, hi) if hi > lo else lo
+
+
+LATENCY_POLICY = LatencyPolicy.from_config(
+    sett.HUMANIZED_LATENCY, sett.HUMANIZED_DELAY_DEFAULT, sett.HUMANIZED_DELAY_FLOWS
+)
+
+
+_OUTBOUND = None
+_OUTBOUND_LOCK = threading.Lock()
+
+
+def get_outbound() -> OutboundQueue:
+    """Devuelve la cola de salida global, creándola y arrancándola la primera vez."""
+    global _OUTBOUND
+    with _OUTBOUND_LOCK:
+        if _OUTBOUND is None:
+            _OUTBOUND = OutboundQueue(
+                sett.OUTBOUND_SENDERS,
+                sett.OUTBOUND_MAX_RETRIES,
+                sett.OUTBOUND_BACKOFF_BASE,
+                sett.OUTBOUND_BACKOFF_MAX,
+                sett.DEAD_LETTER_SIZE,
+            )
+            _OUTBOUND.start()
+        return _OUTBOUND
@@ -0,0 +1,266 @@
+# outbox.py
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import sett
+import metrics
+import outbound
+import transport
+
+# ===================================================================
+# OUTBOX TRANSACCIONAL (entrega at-least-once de respuestas/recordatorios)
+# ===================================================================
+# Cada payload saliente se escribe primero en la tabla outbox, en la MISMA
+# transacción que el cambio de estado que lo origina (pickup_mark, el
+# UPDATE a 'missed' del scheduler...). Tras el COMMIT se entrega de
+# inmediato a la cola de salida con un lease a nombre del proceso; al
+# confirmarse el envío las filas se borran en lotes (group commit).
+#
+# Si un worker muere antes de enviar, sus filas quedan con el lease
+# vencido y el hilo de recuperación de cualquier proceso las reclama y
+# reenvía. Las filas 'dead' (sin reintentos) quedan para inspección y se
+# purgan pasada la retención. Con el circuit breaker abierto las filas quedan estacionadas
+# (lease hasta la siguiente prueba) y no se reclaman. Un envío duplicado es posible tras una caída; el lado que
+# recibe lo absorbe por messageId (dedup).
+
+
+class _Tx:
+    """Transacción abierta: conexión + payloads a entregar tras el COMMIT."""
+
+    __slots__ = ("outbox", "cx", "staged")
+
+    def __init__(self, outbox, cx):
+        self.outbox = outbox
+        self.cx = cx
+        self.staged = []
+
+    def add(self, number, payloads, inicio=None, espaciado=0.0):
+        """
+        Escribe payloads para number dentro de la transacción. inicio es un
+        time.monotonic() (por defecto ya); cada payload sale `espaciado`
+        segundos después del anterior.
+        """
+        self.staged.extend(self.outbox.stage(self.cx, number, payloads, inicio, espaciado))
+
+
+class Outbox:
+    """Tabla outbox + hilos de recuperación y de group commit."""
+
+    def __init__(self, connect, lease_seconds: float, poll_seconds: float,
+                 commit_interval: float, batch_size: int, dead_retention: float = 7 * 86400):
+        self.connect = connect
+        self.lease = lease_seconds
+        self.dead_retention = dead_retention
+        self.poll = poll_seconds
+        self.commit_interval = commit_interval
+        self.batch_size = max(1, batch_size)
+        self.owner = f"{os.getpid()}"
+        self._local = threading.local()
+        self._done = []                    # [(id, ok)] pendientes de confirmar
+        self._done_cv = threading.Condition()
+        self._commits = 0                  # solo lo toca el hilo de confirmación
+        self._lock = threading.Lock()
+        self._started = False
+        cx = self._conn()
+        with cx:
+            cx.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    number TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    not_before REAL NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    owner TEXT,
+                    lease_until REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            cx.execute("CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox(status, lease_until)")
+
+    def _conn(self):
+        cx = getattr(self._local, "cx", None)
+        if cx is None:
+            cx = self._local.cx = self.connect()
+            cx.execute("PRAGMA busy_timeout=5000")
+        return cx
+
+    def start(self):
+        """Arranca los hilos de recuperación y de confirmación (idempotente)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            threading.Thread(target=self._committer, name="outbox-commit", daemon=True).start()
+            threading.Thread(target=self._recover_loop, name="outbox-recover", daemon=True).start()
+        print(f"📮 Outbox iniciado (lease {self.lease:.0f}s).")
+
+    # ---------- escritura ----------
+    def stage(self, cx, number, payloads, inicio=None, espaciado=0.0) -> list:
+        """INSERT en bloque dentro de la transacción de cx. No hace COMMIT."""
+        now_mono, now_wall = time.monotonic(), time.time()
+        base = now_mono if inicio is None else inicio
+        staged = []
+        for payload in payloads:
+            if not payload or not payload.strip():
+                continue
+            # el espaciado cuenta solo los payloads escritos, no los vacíos
+            due_mono = base + len(staged) * espaciado
+            due_wall = now_wall + max(0.0, due_mono - now_mono)
+            cur = cx.execute(
+                """INSERT INTO outbox(number, data, not_before, owner, lease_until, created_at)
+                   VALUES(?,?,?,?,?,?)""",
+                (number, payload, due_wall, self.owner, due_wall + self.lease, now_wall),
+            )
+            staged.append((cur.lastrowid, number, payload, due_mono))
+        metrics.incr("outbox.staged", len(staged))
+        return staged
+
+    @contextmanager
+    def transaction(self):
+        """
+        with outbox.transaction() as tx: ... tx.cx.execute(...); tx.add(...)
+        Todo se confirma junto; los payloads se entregan solo tras el COMMIT.
+        """
+        cx = self._conn()
+        tx = _Tx(self, cx)
+        with cx:
+            yield tx
+            self._confirmar(cx)
+        self.dispatch(tx.staged)
+
+    @metrics.medido("db")
+    def _confirmar(self, cx):
+        """COMMIT de transaction(): cuenta en el tramo db del mensaje (dentro de send, en send)."""
+        cx.commit()
+
+    def send(self, number, payloads, inicio=None, espaciado=0.0):
+        """Escribe y entrega payloads en su propia transacción."""
+        with self.transaction() as tx:
+            tx.add(number, payloads, inicio, espaciado)
+
+    def dispatch(self, staged):
+        """Entrega a la cola de salida filas ya confirmadas y con lease propio."""
+        q = outbound.get_outbound()
+        for row_id, number, payload, due_mono in staged:
+            q.enqueue(number, payload, on_done=self._on_done_cb(row_id), not_before=due_mono)
+
+    # ---------- confirmación (group commit) ----------
+    def _on_done_cb(self, row_id):
+        def on_done(ok):
+            with self._done_cv:
+                self._done.append((row_id, ok))
+                if len(self._done) == 1 or len(self._done) >= self.batch_size:
+                    self._done_cv.notify()
+        return on_done
+
+    def _committer(self):
+        while True:
+            with self._done_cv:
+                self._done_cv.wait_for(lambda: self._done)
+                # Junta lo que llegue durante la ventana para un solo COMMIT
+                self._done_cv.wait_for(lambda: len(self._done) >= self.batch_size,
+                                       timeout=self.commit_interval)
+                batch, self._done = self._done, []
+            try:
+                self._commit(batch)
+            except sqlite3.Error as e:
+                # Sin confirmar: el lease vencerá y se reenviarán (at-least-once)
+                metrics.incr("outbox.commit_errors")
+                print(f"❌ [outbox] error confirmando {len(batch)} envíos: {e}")
+
+    def _commit(self, batch):
+        sent = [(row_id,) for row_id, ok in batch if ok]
+        dead = [(row_id,) for row_id, ok in batch if ok is False]
+        retry_at = time.time() + transport.BREAKER.retry_in()
+        parked = [(retry_at, row_id) for row_id, ok in batch if ok is None]
+        cx = self._conn()
+        with cx:
+            if sent:
+                cx.executemany("DELETE FROM outbox WHERE id=?", sent)
+            if dead:
+                cx.executemany("UPDATE outbox SET status='dead' WHERE id=?", dead)
+            if parked:
+                cx.executemany("UPDATE outbox SET lease_until=? WHERE id=?", parked)
+            self._commits += 1
+            if self._commits % 500 == 0:
+                cx.execute("DELETE FROM outbox WHERE status='dead' AND created_at < ?",
+                           (time.time() - self.dead_retention,))
+        metrics.incr("outbox.commits")
+        metrics.gauge_max("outbox.commit_batch_max", len(batch))
+        metrics.incr("outbox.sent", len(sent))
+        if dead:
+            metrics.incr("outbox.dead", len(dead))
+        if parked:
+            metrics.incr("outbox.parked", len(parked))
+
+    # ---------- recuperación de filas huérfanas ----------
+    def claim_expired(self) -> list:
+        """Toma (con lease nuevo) filas pendientes cuyo lease venció."""
+        now = time.time()
+        cx = self._conn()
+        cx.execute("BEGIN IMMEDIATE")
+        try:
+            rows = cx.execute(
+                """SELECT id, number, data, not_before FROM outbox
+                   WHERE status='pending' AND lease_until < ?
+                   ORDER BY id LIMIT ?""",
+                (now, self.batch_size * 10),
+            ).fetchall()
+            cx.executemany(
+                "UPDATE outbox SET owner=?, lease_until=?, attempts=attempts+1 WHERE id=?",
+                [(self.owner, max(now, nb) + self.lease, row_id) for row_id, _, _, nb in rows],
+            )
+            cx.execute("COMMIT")
+        except Exception:
+            cx.execute("ROLLBACK")
+            raise
+        now_mono = time.monotonic()
+        return [(row_id, number, data, now_mono + max(0.0, nb - now))
+                for row_id, number, data, nb in rows]
+
+    def _recover_loop(self):
+        while True:
+            time.sleep(self.poll)
+            if transport.BREAKER.retry_in() > 0:
+                continue   # circuito abierto: se reclamará cuando pueda probar
+            try:
+                staged = self.claim_expired()
+                if staged:
+                    metrics.incr("outbox.recovered", len(staged))
+                    print(f"♻️ [outbox] reenviando {len(staged)} payloads huérfanos")
+                    self.dispatch(staged)
+            except sqlite3.Error as e:
+                print(f"❌ [outbox] error recuperando pendientes: {e}")
+
+    def stats(self) -> dict:
+        cx = self._conn()
+        counts = dict(cx.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        return {"pending": counts.get("pending", 0), "dead": counts.get("dead", 0)}
+
+
+_OUTBOX = None
+_OUTBOX_LOCK = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    """Devuelve el outbox global, creándolo y arrancándolo la primera vez."""
+    global _OUTBOX
+    with _OUTBOX_LOCK:
+        if _OUTBOX is None:
+            from services import db_conn   # import diferido: services usa este módulo
+            _OUTBOX = Outbox(
+                db_conn,
+                sett.OUTBOX_LEASE_SECONDS,
+                sett.OUTBOX_POLL_SECONDS,
+                sett.OUTBOX_COMMIT_INTERVAL,
+                sett.OUTBOX_BATCH_SIZE,
+                sett.OUTBOX_DEAD_RETENTION_SECONDS,
+            )
+            _OUTBOX.start()
+        return _OUTBOX
@@ -0,0 +1,61 @@
+# payload_cache.py
+import json
+import re
+
+# ===================================================================
+# PLANTILLAS PRE-SERIALIZADAS PARA MENSAJES ESTÁTICOS
+# ===================================================================
+# Los menús y guías fijos se construyen UNA vez con los mismos builders
+# (text_Message, buttonReply_Message, listReply_Message) usando marcadores
+# en lugar del número/nombre. El JSON resultante se corta en trozos de
+# bytes y en cada envío solo se intercalan los valores: sin json.dumps del
+# cuerpo completo en el camino caliente. El resultado es idéntico byte a
+# byte al del builder.
+
+_SLOT_RE = re.compile(r"@@SLOT_(\w+)@@")
+
+
+def slot(name: str) -> str:
+    """Marcador para un valor variable dentro de la plantilla."""
+    return f"@@SLOT_{name}@@"
+
+
+TO = slot("to")
+
+
+def _escape(value) -> bytes:
+    value = str(value)
+    if value.isdigit() and value.isascii():
+        return value.encode("ascii")   # números de teléfono: nada que escapar
+    # Mismo escape que json.dumps (ensure_ascii=True), sin las comillas
+    return json.dumps(value)[1:-1].encode("ascii")
+
+
+class PayloadTemplate:
+    """JSON compilado en trozos de bytes + nombres de slots intercalados."""
+
+    __slots__ = ("parts", "slots", "builder", "args")
+
+    def __init__(self, serialized: str, builder=None, args=()):
+        pieces = _SLOT_RE.split(serialized)
+        self.parts = [p.encode("ascii") for p in pieces[0::2]]
+        self.slots = pieces[1::2]
+        # Origen de la plantilla (para benchmarks y verificación)
+        self.builder = builder
+        self.args = args
+
+    def render(self, to: str, **values) -> bytes:
+        values["to"] = to
+        out = [self.parts[0]]
+        for name, part in zip(self.slots, self.parts[1:]):
+            out.append(_escape(values[name]))
+            out.append(part)
+        return b"".join(out)
+
+
+def compilar(builder, *args) -> PayloadTemplate:
+    """
+    Compila builder(*args) a plantilla. Usa TO / slot("...") en los args
+    (o dentro de los textos) donde van los valores variables.
+    """
+    return PayloadTemplate(builder(*args), builder, args)
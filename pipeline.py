@@ -0,0 +1,179 @@
+# pipeline.py
+import queue
+import threading
+import time
+import zlib
+
+import sett
+import metrics
+
+# ===================================================================
+# PIPELINE DE ENTRADA: ACK INMEDIATO + CARRILES SERIALES POR REMITENTE
+# ===================================================================
+# El webhook valida y encola; cada número se asigna por hash a uno de N
+# carriles (una cola acotada + un hilo). Así los mensajes de un mismo
+# usuario se ejecutan estrictamente en orden (las sesiones en services.py
+# no tienen locks) y usuarios distintos avanzan en paralelo. Si el carril
+# está lleno se rechaza para que Meta reintente más tarde (backpressure).
+
+
+def lane_for(number: str, lanes: int) -> int:
+    """Hash estable del número → índice de carril."""
+    return zlib.crc32(number.encode("utf-8")) % lanes
+
+
+class _Lane:
+    """Cola acotada atendida por un único hilo (ejecución serial)."""
+
+    def __init__(self, index: int, maxsize: int, pipeline):
+        self.index = index
+        self.queue = queue.Queue(maxsize=max(1, maxsize))
+        self.pipeline = pipeline
+        self.busy = False
+        self.busy_seconds = 0.0
+        self.processed = 0
+        self.max_depth = 0
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self._run, name=f"webhook-lane-{self.index}", daemon=True
+        )
+        self.thread.start()
+
+    def put(self, jobs) -> bool:
+        try:
+            self.queue.put_nowait((time.perf_counter(), jobs))
+        except queue.Full:
+            return False
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def _run(self):
+        while True:
+            enqueued_at, jobs = self.queue.get()
+            t0 = time.perf_counter()
+            metrics.observe("webhook.queue_wait_ms", (t0 - enqueued_at) * 1000)
+            self.busy = True
+            self.pipeline._occupancy(+1)
+            try:
+                for args in jobs:
+                    started = time.perf_counter()
+                    try:
+                        self.pipeline.handler(*args)
+                        metrics.incr("webhook.processed")
+                    except Exception as e:
+                        metrics.incr("webhook.failed")
+                        print(f"❌ [webhook-lane-{self.index}] error procesando mensaje: {e}")
+                    metrics.observe("webhook.process_ms", (time.perf_counter() - started) * 1000)
+                    self.processed += 1
+            finally:
+                self.busy = False
+                self.busy_seconds += time.perf_counter() - t0
+                self.pipeline._occupancy(-1)
+                self.queue.task_done()
+
+
+class WebhookPipeline:
+    """N carriles seriales; el número del remitente decide el carril."""
+
+    def __init__(self, handler, lanes: int, maxsize: int):
+        self.handler = handler
+        self.lanes_count = max(1, lanes)
+        per_lane = -(-max(1, maxsize) // self.lanes_count)   # ceil
+        self.lanes = [_Lane(i, per_lane, self) for i in range(self.lanes_count)]
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._started_at = None
+
+    def start(self):
+        """Arranca los carriles (idempotente)."""
+        with self._lock:
+            if self._started_at is not None:
+                return
+            self._started_at = time.perf_counter()
+            for lane in self.lanes:
+                lane.start()
+        metrics.gauge("webhook.lanes", self.lanes_count)
+        metrics.gauge("webhook.lane_capacity", self.lanes[0].queue.maxsize)
+        print(f"📥 Pipeline de webhook iniciado ({self.lanes_count} carriles, "
+              f"cola {self.lanes[0].queue.maxsize} por carril).")
+
+    def _occupancy(self, delta: int):
+        with self._lock:
+            self._busy += delta
+            busy = self._busy
+        metrics.gauge("webhook.lanes_busy", busy)
+        metrics.gauge_max("webhook.lanes_busy_max", busy)
+
+    def submit(self, *args) -> bool:
+        """Encola un mensaje. Retorna False si su carril está lleno."""
+        return self._put(args[1], [args])
+
+    def submit_batch(self, mensajes) -> list:
+        """
+        Reparte un lote de mensajes: los de un mismo remitente van juntos y
+        en orden a su carril; remitentes distintos caen en carriles que
+        avanzan en paralelo.
+        Retorna los mensajes que no cupieron en la cola ([] si todo entró).
+        """
+        por_remitente = {}
+        for args in mensajes:
+            por_remitente.setdefault(args[1], []).append(args)
+        rechazados = []
+        for number, grupo in por_remitente.items():
+            if not self._put(number, grupo):
+                rechazados.extend(grupo)
+        return rechazados
+
+    def _put(self, number, jobs) -> bool:
+        lane = self.lanes[lane_for(number, self.lanes_count)]
+        if not lane.put(jobs):
+            metrics.incr("webhook.rejected", len(jobs))
+            return False
+        depth = lane.queue.qsize()
+        metrics.incr("webhook.enqueued", len(jobs))
+        metrics.gauge_max("webhook.lane_depth_max", depth)
+        return True
+
+    def stats(self) -> dict:
+        uptime = time.perf_counter() - (self._started_at or time.perf_counter())
+        lanes = [
+            {
+                "lane": lane.index,
+                "depth": lane.queue.qsize(),
+                "max_depth": lane.max_depth,
+                "busy": lane.busy,
+                "processed": lane.processed,
+                "utilization": round(lane.busy_seconds / uptime, 4) if uptime > 0 else 0.0,
+            }
+            for lane in self.lanes
+        ]
+        return {
+            "lanes": self.lanes_count,
+            "lane_capacity": self.lanes[0].queue.maxsize,
+            "lanes_busy": sum(1 for l in lanes if l["busy"]),
+            "queue_depth": sum(l["depth"] for l in lanes),
+            "per_lane": lanes,
+        }
+
+
+_PIPELINE = None
+_PIPELINE_LOCK = threading.Lock()
+
+
+def get_pipeline(handler=None) -> WebhookPipeline:
+    """Devuelve el pipeline global, creándolo y arrancándolo la primera vez."""
+    global _PIPELINE
+    with _PIPELINE_LOCK:
+        if _PIPELINE is None:
+            if handler is None:
+                import services
+                handler = services.administrar_chatbot
+            _PIPELINE = WebhookPipeline(
+                handler, sett.WEBHOOK_WORKERS, sett.WEBHOOK_QUEUE_SIZE
+            )
+            _PIPELINE.start()
+        return _PIPELINE
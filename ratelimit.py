@@ -0,0 +1,116 @@
+# ratelimit.py
+import sqlite3
+import threading
+import time
+
+import sett
+import metrics
+
+# ===================================================================
+# GOBERNADOR GLOBAL DE TASA DE SALIDA (token bucket entre procesos)
+# ===================================================================
+# gunicorn levanta varios procesos y cada uno envía por su cuenta; en el
+# peak de recordatorios la suma puede superar el límite de mensajes por
+# segundo del número. El bucket vive en una fila de SQLite compartida por
+# todos los procesos: cada envío reserva un token en una transacción
+# corta (BEGIN IMMEDIATE) y, si el bucket quedó en deuda, espera fuera de
+# la transacción lo que falte. Si SQLite falla se deja pasar (fail-open).
+
+
+class TokenBucket:
+    """Token bucket persistido en SQLite, compartido entre procesos."""
+
+    def __init__(self, path: str, name: str, rate: float, burst: float):
+        self.path = path
+        self.name = name
+        self.rate = max(0.001, rate)
+        self.burst = max(1.0, burst)
+        self._local = threading.local()
+        cx = self._conn()
+        cx.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_bucket (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        cx.execute(
+            "INSERT OR IGNORE INTO rate_bucket(name, tokens, updated) VALUES(?,?,?)",
+            (self.name, self.burst, time.time()),
+        )
+
+    def _conn(self):
+        cx = getattr(self._local, "cx", None)
+        if cx is None:
+            # isolation_level=None → control manual de la transacción
+            cx = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                 check_same_thread=False)
+            # mismo modo que services.db_conn: el BEGIN IMMEDIATE de cada envío
+            # no bloquea a los lectores y el COMMIT no hace fsync
+            cx.execute("PRAGMA journal_mode=WAL")
+            cx.execute("PRAGMA synchronous=NORMAL")
+            self._local.cx = cx
+        return cx
+
+    def reserve(self) -> float:
+        """Reserva un token y devuelve cuántos segundos hay que esperar."""
+        cx = self._conn()
+        now = time.time()
+        cx.execute("BEGIN IMMEDIATE")
+        try:
+            row = cx.execute(
+                "SELECT tokens, updated FROM rate_bucket WHERE name=?", (self.name,)
+            ).fetchone()
+            tokens, updated = row if row else (self.burst, now)
+            tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+            tokens -= 1.0
+            cx.execute(
+                "INSERT OR REPLACE INTO rate_bucket(name, tokens, updated) VALUES(?,?,?)",
+                (self.name, tokens, now),
+            )
+            cx.execute("COMMIT")
+        except Exception:
+            cx.execute("ROLLBACK")
+            raise
+        return max(0.0, -tokens / self.rate)
+
+    def acquire(self) -> float:
+        """Bloquea hasta tener permiso para enviar. Devuelve la espera en s."""
+        try:
+            wait = self.reserve()
+        except sqlite3.Error as e:
+            metrics.incr("ratelimit.errors")
+            print(f"⚠️ [ratelimit] error en bucket, se deja pasar: {e}")
+            return 0.0
+        metrics.observe("ratelimit.wait_ms", wait * 1000)
+        if wait > 0:
+            metrics.incr("ratelimit.waited")
+            time.sleep(wait)
+        return wait
+
+
+_BUCKET = None
+_BUCKET_LOCK = threading.Lock()
+
+
+def acquire() -> float:
+    """Pasa por el gobernador global (no-op si RATE_LIMIT_MPS <= 0)."""
+    global _BUCKET
+    if sett.RATE_LIMIT_MPS <= 0:
+        return 0.0
+    if _BUCKET is None:
+        with _BUCKET_LOCK:
+            if _BUCKET is None:
+                # crear la tabla también toca SQLite: mismo fail-open que reserve();
+                # _BUCKET queda en None y el próximo envío lo reintenta
+                try:
+                    _BUCKET = TokenBucket(
+                        sett.RATE_LIMIT_DB, "whatsapp", sett.RATE_LIMIT_MPS, sett.RATE_LIMIT_BURST
+                    )
+                except sqlite3.Error as e:
+                    metrics.incr("ratelimit.errors")
+                    print(f"⚠️ [ratelimit] no se pudo abrir el bucket, se deja pasar: {e}")
+                    return 0.0
+    return _BUCKET.acquire()
@@ -0,0 +1,140 @@
+# router.py
+
+# ===================================================================
+# ROUTER COMPILADO (intenciones del chatbot por tabla)
+# ===================================================================
+# Reemplaza la cadena de if/elif de administrar_chatbot. Cada ruta se
+# registra con un decorador y su prioridad es el orden de registro (el
+# mismo orden que tenía la cadena). Al compilar se arma:
+#   - un dict para los textos exactos,
+#   - un trie de caracteres para los prefijos ("stock agregar ", "retire "...),
+#   - las palabras clave que se buscan dentro del texto, ordenadas por
+#     prioridad: se prueban con `in` (búsqueda en C) hasta la primera que
+#     aparece, sin mirar las de rutas que ya no pueden ganar,
+#   - la lista corta de guardas de sesión (dict lookups).
+# Resolver un mensaje cuesta O(largo del texto) y se queda con la ruta de
+# menor prioridad entre las candidatas, igual que la cadena original
+# (`python bench.py rutas --paridad`). El autómata Aho-Corasick (intents.py)
+# no se usa aquí: en CPython es más lento que unas decenas de `in`
+# (`python bench.py intenciones`).
+
+_FIN = "\0"   # marca de fin de prefijo dentro del trie
+
+
+class Ruta:
+    __slots__ = ("prioridad", "nombre", "destino", "cuando")
+
+    def __init__(self, prioridad, nombre, destino, cuando=None):
+        self.prioridad = prioridad
+        self.nombre = nombre
+        self.destino = destino
+        self.cuando = cuando      # guarda extra: cuando(text, number) -> bool
+
+    def __repr__(self):
+        return f"<Ruta {self.prioridad}:{self.nombre}>"
+
+
+class Router:
+    def __init__(self, prefijo_nombre: str = ""):
+        self._prefijo_nombre = prefijo_nombre
+        self.rutas = []
+        self.defecto = None
+        self._exactos = {}        # { texto: prioridad }
+        self._trie = {}           # { char: nodo }, nodo[_FIN] = [prioridades]
+        self._palabras = {}       # { palabra: prioridad }
+        self._por_prioridad = ()  # ((prioridad, palabra), ...) ascendente
+        self._sesiones = []       # [Ruta] solo con guarda, en orden
+        self._compilado = False
+
+    # ---------- registro ----------
+    def _nombre(self, destino) -> str:
+        nombre = destino.__name__
+        if nombre.startswith(self._prefijo_nombre):
+            nombre = nombre[len(self._prefijo_nombre):]
+        return nombre
+
+    def _registrar(self, destino, cuando=None):
+        ruta = Ruta(len(self.rutas), self._nombre(destino), destino, cuando)
+        self.rutas.append(ruta)
+        self._compilado = False
+        return ruta
+
+    def exacto(self, *textos):
+        """Texto idéntico (tras normalizar y aplicar el mapeo de IDs)."""
+        def deco(fn):
+            ruta = self._registrar(fn)
+            for t in textos:
+                self._exactos.setdefault(t, ruta.prioridad)
+            return fn
+        return deco
+
+    def prefijo(self, *prefijos, cuando=None):
+        """text.startswith(prefijo) [y cuando(text, number)]."""
+        def deco(fn):
+            ruta = self._registrar(fn, cuando)
+            for p in prefijos:
+                nodo = self._trie
+                for ch in p:
+                    nodo = nodo.setdefault(ch, {})
+                nodo.setdefault(_FIN, []).append(ruta.prioridad)
+            return fn
+        return deco
+
+    def palabras(self, *palabras):
+        """Alguna de las palabras aparece en cualquier parte del texto."""
+        def deco(fn):
+            ruta = self._registrar(fn)
+            for w in palabras:
+                self._palabras.setdefault(w, ruta.prioridad)
+            return fn
+        return deco
+
+    def sesion(self, cuando):
+        """Solo depende del estado: cuando(text, number) -> bool."""
+        def deco(fn):
+            self._sesiones.append(self._registrar(fn, cuando))
+            return fn
+        return deco
+
+    def por_defecto(self, fn):
+        """Ruta cuando ninguna otra aplica."""
+        self.defecto = Ruta(len(self.rutas), self._nombre(fn), fn)
+        return fn
+
+    # ---------- compilación ----------
+    def compilar(self):
+        self._por_prioridad = tuple(sorted((p, w) for w, p in self._palabras.items()))
+        self._compilado = True
+        return self
+
+    # ---------- resolución ----------
+    def resolver(self, text: str, number: str) -> Ruta:
+        if not self._compilado:
+            self.compilar()
+        rutas = self.rutas
+        mejor = self._exactos.get(text, len(rutas))
+
+        nodo = self._trie
+        for ch in text:
+            nodo = nodo.get(ch)
+            if nodo is None:
+                break
+            for p in nodo.get(_FIN, ()):
+                if p < mejor and (rutas[p].cuando is None or rutas[p].cuando(text, number)):
+                    mejor = p
+
+        for p, palabra in self._por_prioridad:
+            if p >= mejor:
+                break
+            if palabra in text:
+                mejor = p
+                break
+
+        for ruta in self._sesiones:
+            if ruta.prioridad >= mejor:
+                break
+            if ruta.cuando(text, number):
+                mejor = ruta.prioridad
+                break
+
+        return rutas[mejor] if mejor < len(rutas) else self.defecto
@@ -0,0 +1,157 @@
+# scoring.py
+from collections import namedtuple
+
+import diagnostics
+import textnorm
+from intents import Automata
+
+try:
+    import numpy as np  # opcional: producto matricial en C
+except Exception:
+    np = None
+
+# ===================================================================
+# PUNTAJE DIFERENCIAL (coincidencias parciales en las 12 categorías)
+# ===================================================================
+# diagnostico_<categoria> solo devuelve la primera regla que se cumple
+# entera; si falta un término, no hay diagnóstico. Aquí cada regla recibe
+# una cobertura = grupos cumplidos / grupos de la regla (un grupo es un
+# término o sus alternativas, p. ej. ("presion", "presión")):
+#
+#     X  (mensajes × términos)   1 si el término aparece en el mensaje
+#     G  (términos × grupos)     1 si el término satisface el grupo
+#     A  (grupos × variantes)    1 si el grupo es parte de la variante
+#     cobertura = max por regla de  (min(X·G, 1) · A) / nº de grupos
+#
+# Una variante es cada condición completa de una regla (las reglas con
+# lista de condiciones tienen varias). Con numpy, un lote de mensajes se
+# puntúa con dos productos matriciales; sin numpy se usa el mismo modelo
+# con máscaras de bits por mensaje. Cobertura 1.0 = la regla se cumple,
+# igual que en diagnostics.py. `python bench.py puntaje` mide ambos caminos.
+# La conversación usa puntuar_sintomas() con los IDs canónicos ya
+# extraídos (symptoms.py): cada ID marca las columnas de todas sus variantes.
+
+Puntaje = namedtuple("Puntaje", "categoria cobertura diagnostico nivel recomendacion")
+
+# Nombre de categoría de la conversación (como en SINTOMAS_CONOCIDOS)
+_CONVERSACION = {regla: conversacion for conversacion, regla in diagnostics.ALIAS.items()}
+
+
+class Puntuador:
+    def __init__(self, reglas: dict = None, usar_numpy: bool = True):
+        reglas = diagnostics.REGLAS if reglas is None else reglas
+        self.terminos = {}        # { término: columna de X }
+        self.reglas = []          # [(categoria, Regla)] en orden de prioridad
+        grupos = []               # [(índices de término)]
+        variantes = []            # [(índice de regla, (índices de grupo))]
+        for categoria, lista in reglas.items():
+            for regla in lista:
+                r = len(self.reglas)
+                self.reglas.append((_CONVERSACION.get(categoria, categoria), regla))
+                for conjuncion in (regla.si if isinstance(regla.si, list) else [regla.si]):
+                    indices = []
+                    for grupo in conjuncion:
+                        alternativas = (grupo,) if isinstance(grupo, str) else grupo
+                        indices.append(len(grupos))
+                        grupos.append(tuple(self.terminos.setdefault(t, len(self.terminos))
+                                            for t in alternativas))
+                    variantes.append((r, tuple(indices)))
+        self._automata = Automata(self.terminos.items())
+        self._columnas = {}       # { ID canónico: (columnas de sus variantes) }
+        for termino, columna in self.terminos.items():
+            sintoma = textnorm.normalizar(termino)
+            self._columnas[sintoma] = self._columnas.get(sintoma, ()) + (columna,)
+
+        # Camino sin numpy: máscara de términos por grupo, grupos por variante
+        self._grupos = [sum(1 << t for t in g) for g in grupos]
+        self._variantes = variantes
+
+        self.numpy = usar_numpy and np is not None
+        if self.numpy:
+            # conteos enteros y una sola división: mismas coberturas (y 1.0
+            # exacto) que el camino con bits
+            self._G = np.zeros((len(self.terminos), len(grupos)))
+            for g, indices in enumerate(grupos):
+                self._G[list(indices), g] = 1.0
+            self._A = np.zeros((len(grupos), len(variantes)))
+            for v, (_, indices) in enumerate(variantes):
+                self._A[list(indices), v] = 1.0
+            self._tamanos = np.array([len(indices) for _, indices in variantes], dtype=float)
+            # las variantes de una regla son contiguas: max por tramos
+            self._inicios = np.array([v for v, (r, _) in enumerate(variantes)
+                                      if v == 0 or variantes[v - 1][0] != r])
+
+    def indices(self, texto: str) -> list:
+        """Columnas de X presentes en el texto (una pasada del autómata)."""
+        terminos = self.terminos
+        return [terminos[p] for p in self._automata.palabras(texto.lower())]
+
+    def indices_sintomas(self, sintomas) -> list:
+        """Columnas de X de los IDs canónicos (sin volver al texto)."""
+        columnas = self._columnas
+        return [c for s in sintomas for c in columnas.get(s, ())]
+
+    # ---------- coberturas crudas ----------
+    def coberturas(self, textos: list):
+        """Matriz (mensajes × reglas) de coberturas en [0, 1]."""
+        return self._coberturas([self.indices(texto) for texto in textos])
+
+    def _coberturas(self, filas: list):
+        if self.numpy:
+            X = np.zeros((len(filas), len(self.terminos)))
+            for i, indices in enumerate(filas):
+                X[i, indices] = 1.0
+            S = (np.minimum(X @ self._G, 1.0) @ self._A) / self._tamanos
+            return np.maximum.reduceat(S, self._inicios, axis=1)
+        return [self._coberturas_bits(indices) for indices in filas]
+
+    def _coberturas_bits(self, indices: list) -> list:
+        m = 0
+        for t in indices:
+            m |= 1 << t
+        coberturas = [0.0] * len(self.reglas)
+        if m:
+            grupos = self._grupos
+            for r, indices in self._variantes:
+                cumplidos = 0
+                for g in indices:
+                    if m & grupos[g]:
+                        cumplidos += 1
+                if cumplidos:
+                    c = cumplidos / len(indices)
+                    if c > coberturas[r]:
+                        coberturas[r] = c
+        return coberturas
+
+    # ---------- ranking ----------
+    def _ranking(self, fila, minimo: float, limite: int) -> list:
+        # a igual cobertura manda la prioridad de las reglas
+        orden = sorted((-c, r) for r, c in enumerate(fila) if c and c >= minimo)
+        if limite:
+            orden = orden[:limite]
+        puntajes = []
+        for c, r in orden:
+            categoria, regla = self.reglas[r]
+            puntajes.append(Puntaje(categoria, -c, regla.diagnostico, regla.nivel, regla.recomendacion))
+        return puntajes
+
+    def puntuar_lote(self, textos: list, minimo: float = 0.0, limite: int = None) -> list:
+        """[[Puntaje] por mensaje], de mayor a menor cobertura."""
+        matriz = self.coberturas(textos)
+        if self.numpy:
+            matriz = matriz.tolist()
+        return [self._ranking(fila, minimo, limite) for fila in matriz]
+
+    def _puntuar(self, indices: list, minimo: float, limite: int) -> list:
+        if self.numpy:
+            return self._ranking(self._coberturas([indices])[0].tolist(), minimo, limite)
+        # sin numpy no hace falta armar la matriz
+        return self._ranking(self._coberturas_bits(indices), minimo, limite)
+
+    def puntuar(self, texto: str, minimo: float = 0.0, limite: int = None) -> list:
+        """[Puntaje] de un mensaje."""
+        return self._puntuar(self.indices(texto), minimo, limite)
+
+    def puntuar_sintomas(self, sintomas, minimo: float = 0.0, limite: int = None) -> list:
+        """[Puntaje] a partir de los IDs canónicos ya extraídos."""
+        return self._puntuar(self.indices_sintomas(sintomas), minimo, limite)
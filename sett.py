@@ -25,3 +25,105 @@ if not EMAIL_USER or not EMAIL_PASS:
     raise RuntimeError(
         "Faltan las variables EMAIL_USER o EMAIL_PASS para el envío de correo"
     )
+
+# ----------------------------------------
+# Procesamiento asíncrono del webhook
+# ----------------------------------------
+# 1 = responde 200 al instante y procesa en segundo plano; 0 = procesa inline
+WEBHOOK_ASYNC       = os.getenv("WEBHOOK_ASYNC", "1") == "1"
+WEBHOOK_QUEUE_SIZE  = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))
+# Cada worker es un carril serial; un mismo número siempre cae en el mismo
+WEBHOOK_WORKERS     = int(os.getenv("WEBHOOK_WORKERS", 4))
+
+# ----------------------------------------
+# Deduplicación de mensajes entrantes
+# ----------------------------------------
+DEDUP_TTL_SECONDS = int(os.getenv("DEDUP_TTL_SECONDS", 86400))
+DEDUP_CACHE_SIZE  = int(os.getenv("DEDUP_CACHE_SIZE", 10000))
+
+# ----------------------------------------
+# Transporte HTTP hacia la Graph API
+# ----------------------------------------
+HTTP_POOL_SIZE       = int(os.getenv("HTTP_POOL_SIZE", 10))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+HTTP_READ_TIMEOUT    = float(os.getenv("HTTP_READ_TIMEOUT", 10))
+
+# ----------------------------------------
+# Cola de salida (envíos asíncronos)
+# ----------------------------------------
+OUTBOUND_SENDERS      = int(os.getenv("OUTBOUND_SENDERS", 4))      # envíos concurrentes
+OUTBOUND_MAX_RETRIES  = int(os.getenv("OUTBOUND_MAX_RETRIES", 5))
+OUTBOUND_BACKOFF_BASE = float(os.getenv("OUTBOUND_BACKOFF_BASE", 0.5))
+OUTBOUND_BACKOFF_MAX  = float(os.getenv("OUTBOUND_BACKOFF_MAX", 30))
+DEAD_LETTER_SIZE      = int(os.getenv("DEAD_LETTER_SIZE", 500))
+# Pool aparte para acuses markRead, sin reintentos (la reacción inicial va por la cola ordenada)
+ACK_SENDERS           = int(os.getenv("ACK_SENDERS", 4))
+# Separación entre respuestas consecutivas (entrega diferida, no bloquea)
+REPLY_SPACING_SECONDS = float(os.getenv("REPLY_SPACING_SECONDS", 1))
+
+# ----------------------------------------
+# Latencia "humanizada" (demora mínima percibida, no bloqueante)
+# ----------------------------------------
+# HUMANIZED_LATENCY=0 la desactiva (pruebas de carga).
+# HUMANIZED_DELAY_FLOWS: "ruta:min-max,ruta:seg" (p.ej. "emergencia:0,saludo:0.3-0.8").
+# Las claves son nombres de ruta de services.RUTAS (_ruta_<nombre>: emergencia,
+# saludo, gracias, no_entendido...); las demás usan HUMANIZED_DELAY_DEFAULT.
+HUMANIZED_LATENCY       = os.getenv("HUMANIZED_LATENCY", "1") == "1"
+HUMANIZED_DELAY_DEFAULT = os.getenv("HUMANIZED_DELAY_DEFAULT", "0.5-1.5")
+HUMANIZED_DELAY_FLOWS   = os.getenv("HUMANIZED_DELAY_FLOWS", "emergencia:0")
+
+# ----------------------------------------
+# Gobernador global de tasa (compartido entre procesos vía SQLite)
+# ----------------------------------------
+# RATE_LIMIT_MPS <= 0 lo desactiva. Por defecto comparte MEDICAI_DB (en modo WAL)
+RATE_LIMIT_MPS   = float(os.getenv("RATE_LIMIT_MPS", 80))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", 80))
+RATE_LIMIT_DB    = os.getenv("RATE_LIMIT_DB", os.getenv("MEDICAI_DB", "medicai.db"))
+
+# ----------------------------------------
+# Outbox transaccional (payloads salientes persistidos en MEDICAI_DB)
+# ----------------------------------------
+OUTBOX_LEASE_SECONDS          = float(os.getenv("OUTBOX_LEASE_SECONDS", 300))
+OUTBOX_POLL_SECONDS           = float(os.getenv("OUTBOX_POLL_SECONDS", 15))
+OUTBOX_COMMIT_INTERVAL        = float(os.getenv("OUTBOX_COMMIT_INTERVAL", 0.05))
+OUTBOX_BATCH_SIZE             = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+OUTBOX_DEAD_RETENTION_SECONDS = float(os.getenv("OUTBOX_DEAD_RETENTION_SECONDS", 604800))
+
+# ----------------------------------------
+# Circuit breaker hacia la Graph API (BREAKER_FAILURES=0 lo desactiva)
+# ----------------------------------------
+BREAKER_FAILURES         = int(os.getenv("BREAKER_FAILURES", 5))
+BREAKER_SLOW_MS          = float(os.getenv("BREAKER_SLOW_MS", 5000))
+BREAKER_OPEN_SECONDS     = float(os.getenv("BREAKER_OPEN_SECONDS", 30))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", 1))
+
+# ----------------------------------------
+# Sesiones de los flujos de varios pasos (flows.py)
+# ----------------------------------------
+# memory: en el proceso (un worker). sqlite: tabla sesiones en MEDICAI_DB.
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+
+# ----------------------------------------
+# Métricas por ruta de administrar_chatbot (GET /metrics/rutas)
+# ----------------------------------------
+# TURN_METRICS=0 las desactiva (sin perfil ni envoltorios en el camino caliente)
+TURN_METRICS = os.getenv("TURN_METRICS", "1") == "1"
+
+# ----------------------------------------
+# Normalización de texto (textnorm.py): textos recientes en una LRU
+# ----------------------------------------
+TEXTNORM_CACHE_SIZE = int(os.getenv("TEXTNORM_CACHE_SIZE", 4096))
+
+# ----------------------------------------
+# Puntaje diferencial (scoring.py): si ninguna regla se cumple entera,
+# mostrar las más cercanas de las 12 categorías. Usa numpy si está instalado.
+# ----------------------------------------
+DIAGNOSTIC_SCORING = os.getenv("DIAGNOSTIC_SCORING", "0") == "1"
+DIAGNOSTIC_SCORING_MIN = float(os.getenv("DIAGNOSTIC_SCORING_MIN", 0.5))
+
+# ----------------------------------------
+# Síntomas con errores de tipeo (fuzzy.py): similitud mínima por palabra
+# (1 = solo coincidencias exactas) y palabras revisadas por mensaje
+# ----------------------------------------
+FUZZY_SIMILARITY = float(os.getenv("FUZZY_SIMILARITY", 0.8))
+FUZZY_MAX_PALABRAS = int(os.getenv("FUZZY_MAX_PALABRAS", 60))
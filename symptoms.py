@@ -0,0 +1,65 @@
+# symptoms.py
+from collections import namedtuple
+
+import diagnostics
+import fuzzy
+import textnorm
+from intents import Automata
+
+# ===================================================================
+# EXTRACCIÓN CANÓNICA DE SÍNTOMAS (una sola etapa para toda la conversación)
+# ===================================================================
+# Antes el paso de extracción buscaba los síntomas conocidos en el texto
+# normalizado y guardaba el texto; la confirmación volvía a leer ese texto
+# con los términos de las reglas, escritos con y sin tilde. Así un mismo
+# mensaje podía listar "congestion nasal" y no cumplir nunca la regla que
+# pide "congestión nasal".
+#
+# Ahora cada síntoma tiene un ID canónico: el término normalizado con
+# textnorm ("congestión nasal" y "congestion nasal" → "congestion nasal").
+# extraer() hace, una vez por mensaje:
+#   1) normalizar + corregir tipeos hacia el vocabulario (fuzzy.py);
+#   2) una pasada del autómata con todos los IDs (síntomas conocidos de
+#      las 12 categorías + términos de las reglas de diagnostics.py).
+# El resultado es un frozenset de IDs sin duplicados; se guarda en la
+# sesión (lista ordenada, JSON) y el diagnóstico, el triaje y el puntaje
+# trabajan sobre esos IDs sin volver al texto.
+
+Extraccion = namedtuple("Extraccion", "sintomas corregidas")
+# sintomas: frozenset de IDs canónicos; corregidas: [(escrita, corregida)]
+
+
+def canonico(termino: str) -> str:
+    """ID canónico de un síntoma: minúsculas y sin tildes."""
+    return textnorm.normalizar(termino)
+
+
+class Extractor:
+    def __init__(self, conocidos: dict, umbral: float, max_palabras: int):
+        """conocidos: { categoria: [síntomas] } en el orden de la conversación."""
+        self.conocidos = {
+            categoria: tuple(dict.fromkeys(canonico(s) for s in sintomas))
+            for categoria, sintomas in conocidos.items()
+        }
+        vocabulario = dict.fromkeys(
+            [*(s for ids in self.conocidos.values() for s in ids),
+             *(s for c in diagnostics.CATEGORIAS.values() for s in c.sintomas)]
+        )
+        self.vocabulario = frozenset(vocabulario)
+        self.umbral = umbral
+        self.max_palabras = max_palabras
+        self.tipeos = fuzzy.IndiceTrigramas(vocabulario)
+        self._automata = Automata((s, s) for s in vocabulario)
+
+    def ids(self, texto: str) -> frozenset:
+        """IDs presentes en el texto tal como viene (sin corregir tipeos)."""
+        return frozenset(self._automata.palabras(textnorm.normalizar(texto)))
+
+    def extraer(self, texto: str) -> Extraccion:
+        texto = textnorm.normalizar(texto)
+        corregido, cambios = self.tipeos.corregir(texto, self.umbral, self.max_palabras)
+        return Extraccion(frozenset(self._automata.palabras(corregido)), cambios)
+
+    def de_categoria(self, sintomas, categoria: str) -> list:
+        """Síntomas conocidos de la categoría entre los IDs, en el orden de la lista."""
+        return [s for s in self.conocidos.get(categoria, ()) if s in sintomas]
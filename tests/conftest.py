@@ -0,0 +1,11 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+# Los módulos viven en la raíz del repo; sett exige credenciales al importar
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("WHATSAPP_TOKEN", "test")
+os.environ.setdefault("WHATSAPP_URL", "http://127.0.0.1:9/test")
+os.environ.setdefault("VERIFY_TOKEN", "test")
+os.environ.setdefault("MEDICAI_DB", os.path.join(tempfile.gettempdir(), "medicai_test.db"))
@@ -0,0 +1,46 @@
+# tests/test_diagnostics.py
+import json
+import os
+
+import pytest
+
+import diagnostics
+
+# Salidas de las funciones diagnostico_* originales (cadenas if/elif) sobre
+# el corpus aleatorio de bench.py; se regenera con
+# `python bench.py paridad --congelar` (necesita la historia de git).
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "diagnosticos_originales.json")
+
+
+def _casos():
+    with open(FIXTURE, encoding="utf-8") as f:
+        fixture = json.load(f)
+    resultados = [tuple(r) for r in fixture["resultados"]]
+    return {nombre: [(t, resultados[i]) for t, i in lista]
+            for nombre, lista in fixture["casos"].items()}
+
+
+CASOS = _casos()
+
+
+def test_fixture_cubre_todas_las_categorias():
+    assert set(CASOS) == set(diagnostics.CATEGORIAS)
+
+
+@pytest.mark.parametrize("categoria", sorted(diagnostics.CATEGORIAS))
+def test_paridad_con_funciones_originales(categoria):
+    compilada = diagnostics.CATEGORIAS[categoria]
+    distintos = [
+        (texto, esperado, compilada.evaluar(texto))
+        for texto, esperado in CASOS[categoria]
+        if compilada.evaluar(texto) != esperado
+    ]
+    assert not distintos, distintos[:5]
+
+
+@pytest.mark.parametrize("categoria", sorted(diagnostics.CATEGORIAS))
+def test_mascara_e_interprete_coinciden(categoria):
+    compilada = diagnostics.CATEGORIAS[categoria]
+    for texto, esperado in CASOS[categoria]:
+        assert compilada.evaluar_mascara(compilada.mascara(texto)) == esperado
+        assert diagnostics.referencia(categoria, texto) == esperado
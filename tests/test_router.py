@@ -0,0 +1,92 @@
+# tests/test_router.py
+import pytest
+
+import services
+
+# Prioridades de RUTAS fijadas contra la cadena if/elif original de
+# administrar_chatbot (la comparación aleatoria completa está en
+# `python bench.py rutas --paridad`). Cada caso: (sesiones, texto, ruta).
+NUMERO = "56900000000"
+
+SIN_SESION = [
+    # texto exacto
+    ("menu_mas", "menu_mas"),
+    ("sede talca", "cita_sede"),
+    ("mis recordatorios", "mis_recordatorios"),
+    ("ver retiros", "mis_retiros"),
+    ("stock de medicamentos", "stock_inicio"),
+    ("ver más ➡️", "orientacion_pagina2"),
+    # prefijo
+    ("cita_datetime_row_3", "cita_fecha_elegida"),
+    ("cita_confirmacion_si", "cita_confirmacion"),
+    ("stock agregar ibuprofeno 10", "stock_agregar"),
+    ("retire paracetamol si", "retire"),
+    ("eliminar recordatorio 2", "eliminar_recordatorio"),
+    # prefijo con guarda extra: orientacion_*_extraccion
+    ("orientacion_bucal_extraccion", "orientacion_categoria"),
+    ("orientacion_bucal", "no_entendido"),
+    # palabra clave en cualquier parte del texto
+    ("muchas gracias doctor", "gracias"),
+    ("bueno chao", "despedida"),
+    ("necesito la guia de ruta", "ruta_inicio"),
+    # colisiones: gana la rama que estaba antes en la cadena
+    ("hola, es urgente", "emergencia"),
+    ("hola y gracias", "saludo"),
+    ("retire paracetamol, gracias", "retire"),
+    ("stock agregar x hola", "saludo"),
+    ("eliminar recordatorio de medicamento", "med_inicio"),
+    ("gracias, agendar cita", "agendar_cita"),
+    ("sede talcazz", "no_entendido"),
+    # sin coincidencias
+    ("", "no_entendido"),
+    ("xyz desconocido", "no_entendido"),
+]
+
+CON_SESION = [
+    # (flujo, paso, datos), texto, ruta
+    (("med", "ask_name", {}), "paracetamol", "med_flujo"),
+    (("med", "ask_name", {}), "hola", "saludo"),
+    (("med", "ask_name", {}), "mis recordatorios", "med_flujo"),
+    (("med", "ask_name", {}), "agendar cita", "agendar_cita"),
+    (("stock", "wait_pickup", {}), "retire paracetamol", "stock_flujo"),
+    (("stock", "activate", {}), "mis recordatorios", "mis_recordatorios"),
+    (("stock", "activate", {}), "stock agregar x 1", "stock_flujo"),
+    (("ruta", "choose_type", {}), "xyz", "ruta_flujo"),
+    (("ruta", "choose_type", {}), "gracias", "gracias"),
+    # orientación en curso va antes que todo, incluso una emergencia
+    (("orientacion", "extraccion", {"categoria": "bucal"}), "hola urgente", "orientacion_activa"),
+    (("orientacion", "extraccion", {"categoria": "bucal"}), "menu_mas", "orientacion_activa"),
+    # el menú de orientación abierto no captura: solo el texto que nadie más atiende
+    (("orientacion", "triage", {}), "hola", "saludo"),
+    (("orientacion", "triage", {}), "me duele la cabeza", "orientacion_triage"),
+]
+
+
+@pytest.fixture(autouse=True)
+def sin_sesiones():
+    services.FLUJOS.almacen.limpiar()
+    yield
+    services.FLUJOS.almacen.limpiar()
+
+
+@pytest.mark.parametrize("texto, ruta", SIN_SESION)
+def test_ruta_sin_sesion(texto, ruta):
+    assert services.RUTAS.resolver(texto, NUMERO).nombre == ruta
+
+
+@pytest.mark.parametrize("sesion, texto, ruta", CON_SESION)
+def test_ruta_con_sesion(sesion, texto, ruta):
+    flujo, paso, datos = sesion
+    services.FLUJOS.iniciar(NUMERO, flujo, paso, **datos)
+    assert services.RUTAS.resolver(texto, NUMERO).nombre == ruta
+
+
+def test_sesion_de_otro_numero_no_cuenta():
+    services.FLUJOS.iniciar("56911111111", "med", "ask_name")
+    assert services.RUTAS.resolver("paracetamol", NUMERO).nombre == "no_entendido"
+
+
+def test_prioridad_es_el_orden_de_registro():
+    assert [r.prioridad for r in services.RUTAS.rutas] == list(range(len(services.RUTAS.rutas)))
+    assert services.RUTAS.rutas[0].nombre == "orientacion_activa"
+    assert services.RUTAS.defecto.nombre == "no_entendido"
@@ -0,0 +1,97 @@
+# textnorm.py
+import re
+import unicodedata
+from functools import lru_cache
+
+import sett
+
+# ===================================================================
+# NORMALIZACIÓN DE TEXTO (minúsculas + sin tildes, una vez por mensaje)
+# ===================================================================
+# Mismo resultado que la versión original (lower → NFD → quitar marcas Mn),
+# pero:
+#   - texto ASCII puro: solo lower(), sin NFD ni filtro por carácter;
+#   - resto: str.translate con una tabla por carácter que se completa sola
+#     la primera vez que aparece cada carácter (en C, sin bucle Python);
+#   - LRU acotada con los textos recientes ("hola", IDs de botones...).
+# Devuelve un Texto: un str que ya está normalizado. normalizar(Texto) y
+# Texto.lower() lo devuelven tal cual, así los matchers que vuelven a
+# pasar el texto por lower() (síntomas, diagnósticos) no lo copian otra vez.
+
+# Caracteres donde procesar carácter a carácter no equivale a procesar el
+# texto completo: sigma mayúscula (lower() depende del contexto) y marcas
+# combinantes que no son Mn (NFD las reordena entre sí). Derivado de
+# unicodedata 14.0; `python bench.py normalizacion` verifica la paridad.
+_CONTEXTUALES = re.compile(
+    "[\u03a3\u1715\u1734\u1b44\u1baa\u1bf2\u1bf3\u302e\u302f\ua953\ua9c0"
+    "\U000111c0\U00011235\U0001134d\U000116b6\U0001193d\U00016ff0\U00016ff1"
+    "\U0001d15e-\U0001d166\U0001d16d-\U0001d172\U0001d1bb-\U0001d1c0]"
+)
+
+# Textos más largos no pasan por la LRU (no desplazan a los frecuentes)
+_LARGO_CACHE = 256
+
+
+def referencia(t: str) -> str:
+    """Algoritmo original, carácter a carácter (fallback y paridad)."""
+    t = t.lower()
+    return ''.join(c for c in unicodedata.normalize('NFD', t)
+                   if unicodedata.category(c) != 'Mn')
+
+
+def _valor(cp: int):
+    """Entrada de tabla para str.translate: ordinal, None (se borra) o str."""
+    valor = referencia(chr(cp))
+    if not valor:
+        return None
+    return ord(valor) if len(valor) == 1 else valor
+
+
+class _Tabla(dict):
+    """{ ord(c): normalizado }; cada carácter nuevo se calcula una vez."""
+
+    def __missing__(self, cp):
+        self[cp] = valor = _valor(cp)
+        return valor
+
+
+# ASCII, Latin-1, Latin extendido y diacríticos combinantes: dict precalculado
+# (translate con dict simple es más rápido que con la subclase perezosa)
+_LATIN = {cp: _valor(cp) for cp in range(0x370)}
+_FUERA_DE_LATIN = re.compile("[^\x00-\u036f]")
+_TABLA = _Tabla(_LATIN)
+
+
+class Texto(str):
+    """str ya normalizado (minúsculas, sin tildes)."""
+
+    __slots__ = ()
+
+    def lower(self):
+        return self
+
+
+def _normalizar(t: str) -> Texto:
+    if t.isascii():
+        return Texto(t.lower())
+    if _FUERA_DE_LATIN.search(t) is None:
+        return Texto(t.translate(_LATIN))
+    if _CONTEXTUALES.search(t):
+        return Texto(referencia(t))
+    return Texto(t.translate(_TABLA))
+
+
+_normalizar_reciente = lru_cache(maxsize=max(0, sett.TEXTNORM_CACHE_SIZE))(_normalizar)
+
+
+def normalizar(t: str) -> Texto:
+    """Minúsculas y sin tildes; un Texto se devuelve sin recalcular."""
+    if isinstance(t, Texto):
+        return t
+    if len(t) > _LARGO_CACHE:
+        return _normalizar(t)
+    return _normalizar_reciente(t)
+
+
+def cache_info():
+    return _normalizar_reciente.cache_info()
@@ -0,0 +1,177 @@
+# transport.py
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import sett
+import metrics
+import ratelimit
+
+# ===================================================================
+# TRANSPORTE HTTP HACIA LA GRAPH API (keep-alive + pool de conexiones)
+# ===================================================================
+# Una única requests.Session compartida reutiliza las conexiones TCP+TLS
+# hacia WHATSAPP_URL en vez de abrir una nueva por cada payload. El pool
+# de urllib3 es thread-safe; pool_block=True limita las conexiones vivas.
+
+Respuesta = namedtuple("Respuesta", "status text retry_after elapsed_ms")
+
+# Status sintético: el circuito está abierto y no se intentó el POST
+CIRCUIT_OPEN = -1
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Devuelve la sesión compartida, creándola la primera vez."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=sett.HTTP_POOL_SIZE,
+                pool_block=True,
+                max_retries=0,
+            )
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            s.headers.update({
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {sett.WHATSAPP_TOKEN}",
+            })
+            _SESSION = s
+        return _SESSION
+
+
+def _retry_after(resp) -> float:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+# ===================================================================
+# CIRCUIT BREAKER (modo degradado cuando la Graph API falla o se pone lenta)
+# ===================================================================
+# closed: todo pasa. Tras BREAKER_FAILURES fallas consecutivas (error de
+# red, 5xx o respuesta más lenta que BREAKER_SLOW_MS) pasa a open y los
+# envíos fallan al instante con CIRCUIT_OPEN, sin ocupar hilos ni
+# conexiones. Pasados BREAKER_OPEN_SECONDS queda half_open: solo unas
+# pocas llamadas de prueba salen; si responden bien se cierra, si no
+# vuelve a abrirse.
+
+_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int, slow_ms: float, open_seconds: float, probes: int):
+        self.enabled = failures > 0
+        self.failures = failures
+        self.slow_ms = slow_ms
+        self.open_seconds = open_seconds
+        self.probes = max(1, probes)
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = 0
+        self._lock = threading.Lock()
+        metrics.gauge("breaker.state", 0)
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        print(f"🔌 [breaker] {self.state} → {state}")
+        self.state = state
+        metrics.incr(f"breaker.to_{state}")
+        metrics.gauge("breaker.state", _STATES[state])
+
+    def allow(self) -> bool:
+        """¿Puede salir una llamada? En half_open reserva un cupo de prueba."""
+        if not self.enabled:
+            return True
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    metrics.incr("breaker.rejected")
+                    return False
+                self._transition("half_open")
+                self._probing = 0
+            if self.state == "half_open":
+                if self._probing >= self.probes:
+                    metrics.incr("breaker.rejected")
+                    return False
+                self._probing += 1
+            return True
+
+    def record(self, status: int, elapsed_ms: float):
+        if not self.enabled:
+            return
+        failed = status == 0 or status >= 500 or elapsed_ms > self.slow_ms
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = max(0, self._probing - 1)
+            if not failed:
+                self._consecutive = 0
+                self._transition("closed")
+                return
+            self._consecutive += 1
+            if self.state == "half_open" or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+                self._transition("open")
+
+    def retry_in(self) -> float:
+        """Segundos hasta la próxima prueba (0 si no está abierto)."""
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive,
+            "retry_in_s": round(self.retry_in(), 3),
+        }
+
+
+BREAKER = CircuitBreaker(
+    sett.BREAKER_FAILURES, sett.BREAKER_SLOW_MS, sett.BREAKER_OPEN_SECONDS, sett.BREAKER_HALF_OPEN_PROBES
+)
+
+
+def post(data) -> Respuesta:
+    """
+    POST de un payload ya serializado a WHATSAPP_URL, pasando antes por el
+    circuit breaker y el gobernador global de tasa. Nunca lanza excepción:
+    los errores de red vuelven con status 0 y el circuito abierto con
+    CIRCUIT_OPEN.
+    """
+    if not BREAKER.allow():
+        return Respuesta(CIRCUIT_OPEN, "circuit open", BREAKER.retry_in(), 0.0)
+    ratelimit.acquire()
+    t0 = time.perf_counter()
+    try:
+        resp = get_session().post(
+            sett.WHATSAPP_URL,
+            data=data,
+            timeout=(sett.HTTP_CONNECT_TIMEOUT, sett.HTTP_READ_TIMEOUT),
+        )
+        elapsed = (time.perf_counter() - t0) * 1000
+        metrics.observe("whatsapp.post_ms", elapsed)
+        metrics.incr(f"whatsapp.status.{resp.status_code}")
+        BREAKER.record(resp.status_code, elapsed)
+        return Respuesta(resp.status_code, resp.text, _retry_after(resp), elapsed)
+    except requests.RequestException as e:
+        elapsed = (time.perf_counter() - t0) * 1000
+        metrics.observe("whatsapp.post_ms", elapsed)
+        metrics.incr("whatsapp.network_errors")
+        BREAKER.record(0, elapsed)
+        return Respuesta(0, str(e), None, elapsed)
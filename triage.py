@@ -0,0 +1,88 @@
+# triage.py
+from collections import namedtuple
+
+import diagnostics
+import symptoms
+
+# ===================================================================
+# ÍNDICE INVERTIDO DE SÍNTOMAS (triaje en texto libre, todas las categorías)
+# ===================================================================
+# Hasta ahora el usuario elegía la categoría en una lista (y "ver más")
+# antes de describir sus síntomas, y solo se buscaba en esa categoría.
+# Este índice va de cada síntoma (ID canónico de symptoms.py: síntomas
+# conocidos + términos de las reglas de diagnostics.py) a las categorías
+# y bits de regla que lo usan:
+#
+#     "fiebre" → ((respiratorio, bit, 4), (infeccioso, bit, 1), ...)
+#
+# clasificar() recibe los IDs que ya extrajo symptoms.Extractor (una
+# pasada por el texto para todo el vocabulario), acumula por categoría la
+# máscara de bits y los síntomas vistos, y evalúa las reglas con esa
+# máscara. Resultado: categorías candidatas ordenadas, cada una con su
+# mejor diagnóstico (completo o parcial).
+
+Candidato = namedtuple("Candidato", "categoria cobertura diagnostico sintomas")
+# cobertura: fracción de los términos de la regla presentes (1.0 = regla
+# completa, el mismo diagnóstico que evaluar_sintomas); diagnostico:
+# (diagnóstico, nivel, recomendación) o None; sintomas: conocidos vistos,
+# en el orden de la lista de la categoría (como Extractor.de_categoria).
+
+
+class IndiceSintomas:
+    def __init__(self, conocidos: dict):
+        """conocidos: { categoria: [síntomas] } en el orden de la conversación."""
+        self.categorias = list(conocidos)
+        self._clausulas = {}      # { categoria: ((req, términos en req, resultado), ...) }
+        postings = {}             # { ID: [(categoria, bits, posición en conocidos o None)] }
+        for categoria, sintomas in conocidos.items():
+            compilada = diagnostics.obtener(categoria)
+            bits = compilada.sintomas if compilada else {}
+            if compilada:
+                self._clausulas[categoria] = tuple(
+                    (req, bin(req).count("1"), resultado) for req, resultado in compilada.clausulas
+                )
+            ids = dict.fromkeys(symptoms.canonico(s) for s in sintomas)
+            posicion = {s: i for i, s in enumerate(ids)}
+            for sintoma in dict.fromkeys([*ids, *bits]):
+                postings.setdefault(sintoma, []).append(
+                    (categoria, bits.get(sintoma, 0), posicion.get(sintoma))
+                )
+        self.postings = {s: tuple(p) for s, p in postings.items()}
+
+    def clasificar(self, sintomas, limite: int = None) -> list:
+        """
+        [Candidato] ordenados (más cobertura primero, luego más síntomas) a
+        partir de los IDs canónicos del mensaje.
+        """
+        mascaras = {}
+        vistos = {}
+        postings = self.postings
+        for sintoma in sintomas:
+            for categoria, bit, posicion in postings.get(sintoma, ()):
+                mascaras[categoria] = mascaras.get(categoria, 0) | bit
+                if posicion is not None:
+                    vistos.setdefault(categoria, []).append((posicion, sintoma))
+
+        candidatos = []
+        for categoria in self.categorias:
+            if categoria not in mascaras:
+                continue
+            m = mascaras[categoria]
+            cobertura, diagnostico = 0.0, None
+            if m:
+                for req, total, resultado in self._clausulas.get(categoria, ()):
+                    presentes = m & req
+                    if presentes == req:
+                        # primera regla completa: la misma que elegiría diagnosticar()
+                        cobertura, diagnostico = 1.0, resultado
+                        break
+                    parcial = bin(presentes).count("1") / total
+                    if parcial > cobertura:
+                        cobertura, diagnostico = parcial, resultado
+            sintomas = vistos.get(categoria, ())
+            if not sintomas and diagnostico is None:
+                continue
+            candidatos.append(Candidato(categoria, cobertura, diagnostico,
+                                        [t for _, t in sorted(sintomas)]))
+        candidatos.sort(key=lambda c: (-c.cobertura, -len(c.sintomas)))
+        return candidatos[:limite] if limite else candidatos